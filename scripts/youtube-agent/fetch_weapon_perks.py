@@ -14,8 +14,24 @@ Requires BUNGIE_API_KEY in .env file.
 import os
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+# Optional: faster parsing of the large manifest tables
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Optional: incremental parsing so the item table is never held in memory whole
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+
 load_dotenv()
 
 BUNGIE_API_KEY = os.getenv('BUNGIE_API_KEY')
@@ -46,59 +62,108 @@ def get_headers():
     }
 
 
+_session = None
+
+
+def get_session():
+    """Get the shared Bungie session so every download reuses one connection pool."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.headers.update(get_headers())
+        # Retry transient server errors on the large table downloads
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504))
+        session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries))
+        _session = session
+    return _session
+
+
 def fetch_manifest_info():
     """Fetch manifest metadata from Bungie API."""
     print("Fetching manifest info...")
-    resp = requests.get(
-        f"{BUNGIE_BASE_URL}/Platform/Destiny2/Manifest/",
-        headers=get_headers()
-    )
+    resp = get_session().get(f"{BUNGIE_BASE_URL}/Platform/Destiny2/Manifest/")
     resp.raise_for_status()
     return resp.json()['Response']
 
 
-def download_manifest_table(manifest_info, table_name):
-    """Download a specific manifest table."""
-    print(f"Downloading {table_name}...")
-
-    # Get the content path for this table
+def get_table_url(manifest_info, table_name):
+    """Get the download URL for a specific manifest table."""
     content_paths = manifest_info['jsonWorldComponentContentPaths']['en']
     if table_name not in content_paths:
         raise ValueError(f"Table {table_name} not found in manifest")
+    return f"{BUNGIE_BASE_URL}{content_paths[table_name]}"
+
+
+def download_manifest_table(manifest_info, table_name):
+    """Download a specific manifest table."""
+    print(f"Downloading {table_name}...")
 
-    table_path = content_paths[table_name]
-    resp = requests.get(f"{BUNGIE_BASE_URL}{table_path}", headers=get_headers())
+    resp = get_session().get(get_table_url(manifest_info, table_name))
     resp.raise_for_status()
 
-    data = resp.json()
+    data = orjson.loads(resp.content) if HAS_ORJSON else resp.json()
     print(f"  Downloaded {len(data)} entries")
     return data
 
 
-def extract_weapon_perk_pools(items, plug_sets, socket_types):
-    """Extract perk pools for each legendary weapon."""
-    print("\nExtracting weapon perk pools...")
+def stream_manifest_table(manifest_info, table_name):
+    """Download a manifest table, yielding (hash, entry) pairs.
+
+    With ijson installed the response is parsed as it arrives, so the table
+    is never held in memory as a whole.
+    """
+    if not HAS_IJSON:
+        yield from download_manifest_table(manifest_info, table_name).items()
+        return
+
+    print(f"Streaming {table_name}...")
+
+    resp = get_session().get(get_table_url(manifest_info, table_name), stream=True)
+    resp.raise_for_status()
+    resp.raw.decode_content = True
+
+    yield from ijson.kvitems(resp.raw, '', use_float=True)
+
+
+def extract_pools_and_perk_names(items, plug_sets):
+    """Extract perk pools for each legendary weapon and a perk hash → name lookup.
+
+    Both are built in a single pass so the item table only has to be walked
+    (or streamed) once.
+    """
+    print("\nExtracting weapon perk pools and perk names...")
 
     weapon_pools = {}
-    weapon_count = 0
+    perk_names = {}
+    item_count = 0
+
+    # Bind the hot per-socket lookup once, outside the ~30k item loop
+    get_plug_set = plug_sets.get
+
+    for item_hash, item in items:
+        item_count += 1
+
+        # Check if it's a perk/mod (has plug category)
+        if item.get('plug'):
+            name = item.get('displayProperties', {}).get('name', '')
+            if name:
+                perk_names[int(item_hash)] = name
 
-    for item_hash, item in items.items():
         # Filter for legendary weapons
-        if item.get('inventory', {}).get('tierType') != LEGENDARY_TIER:
+        inventory = item.get('inventory', {})
+        if inventory.get('tierType') != LEGENDARY_TIER:
             continue
-        if item.get('inventory', {}).get('bucketTypeHash') not in WEAPON_BUCKETS:
+        if inventory.get('bucketTypeHash') not in WEAPON_BUCKETS:
             continue
 
         # Must have sockets
         sockets = item.get('sockets', {})
         socket_entries = sockets.get('socketEntries', [])
-        socket_categories = sockets.get('socketCategories', [])
 
         if not socket_entries:
             continue
 
         weapon_name = item.get('displayProperties', {}).get('name', 'Unknown')
-        weapon_count += 1
 
         # Build perk pool for this weapon
         perk_pool = {
@@ -110,16 +175,6 @@ def extract_weapon_perk_pools(items, plug_sets, socket_types):
             'origin': []
         }
 
-        # Map socket indices to categories
-        socket_category_map = {}
-        for cat in socket_categories:
-            cat_hash = cat.get('socketCategoryHash')
-            for idx in cat.get('socketIndexes', []):
-                socket_category_map[idx] = cat_hash
-
-        # Track which trait column we're on
-        trait_index = 0
-
         for idx, socket in enumerate(socket_entries):
             # Get plug set hash (random or reusable)
             plug_set_hash = socket.get('randomizedPlugSetHash') or socket.get('reusablePlugSetHash')
@@ -127,7 +182,9 @@ def extract_weapon_perk_pools(items, plug_sets, socket_types):
                 continue
 
             # Get the plug set
-            plug_set = plug_sets.get(str(plug_set_hash), {})
+            plug_set = get_plug_set(str(plug_set_hash))
+            if not plug_set:
+                continue
             plugs = plug_set.get('reusablePlugItems', [])
 
             # Get perk hashes from plug set
@@ -136,12 +193,7 @@ def extract_weapon_perk_pools(items, plug_sets, socket_types):
             if not perk_hashes:
                 continue
 
-            # Determine socket type by looking at the socket type hash
-            socket_type_hash = socket.get('socketTypeHash')
-            socket_type = socket_types.get(str(socket_type_hash), {})
-            socket_category = socket_type.get('socketCategoryHash', 0)
-
-            # Categorize based on socket index and category
+            # Categorize based on socket index
             # Typically: 0=barrel, 1=magazine, 2=trait1, 3=trait2, 4+=origin/mods
             if idx == 0:
                 perk_pool['barrels'] = perk_hashes
@@ -160,24 +212,21 @@ def extract_weapon_perk_pools(items, plug_sets, socket_types):
                 perk_pool['trait1'], perk_pool['trait2']]):
             weapon_pools[item_hash] = perk_pool
 
+    print(f"  Scanned {item_count} items")
     print(f"  Extracted perk pools for {len(weapon_pools)} weapons")
-    return weapon_pools
-
-
-def build_perk_name_lookup(items):
-    """Build a lookup from perk hash to name."""
-    print("\nBuilding perk name lookup...")
-    perk_names = {}
+    print(f"  Found {len(perk_names)} perk names")
+    return weapon_pools, perk_names
 
-    for item_hash, item in items.items():
-        # Check if it's a perk/mod (has plug category)
-        if item.get('plug'):
-            name = item.get('displayProperties', {}).get('name', '')
-            if name:
-                perk_names[int(item_hash)] = name
 
-    print(f"  Found {len(perk_names)} perk names")
-    return perk_names
+def save_json(path, data):
+    """Write data as indented JSON, using orjson when available."""
+    if HAS_ORJSON:
+        # perk_names is keyed by int hash, which orjson only accepts with OPT_NON_STR_KEYS
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
 
 
 def main():
@@ -195,27 +244,22 @@ def main():
         manifest_info = fetch_manifest_info()
         print(f"  Manifest version: {manifest_info['version']}")
 
-        # Download required tables
-        items = download_manifest_table(manifest_info, 'DestinyInventoryItemDefinition')
+        # Download the plug set table first; the item table is then streamed
+        # through a single extraction pass
         plug_sets = download_manifest_table(manifest_info, 'DestinyPlugSetDefinition')
-        socket_types = download_manifest_table(manifest_info, 'DestinySocketTypeDefinition')
-
-        # Extract weapon perk pools
-        weapon_pools = extract_weapon_perk_pools(items, plug_sets, socket_types)
+        items = stream_manifest_table(manifest_info, 'DestinyInventoryItemDefinition')
 
-        # Build perk name lookup (for debugging/reference)
-        perk_names = build_perk_name_lookup(items)
+        # Extract weapon perk pools and perk name lookup (for debugging/reference)
+        weapon_pools, perk_names = extract_pools_and_perk_names(items, plug_sets)
 
         # Save weapon perk pools
         output_file = 'weapon_perk_pools.json'
-        with open(output_file, 'w') as f:
-            json.dump(weapon_pools, f, indent=2)
+        save_json(output_file, weapon_pools)
         print(f"\n✅ Saved weapon perk pools to {output_file}")
 
         # Save perk names (for reference)
         perk_names_file = 'perk_names.json'
-        with open(perk_names_file, 'w') as f:
-            json.dump(perk_names, f, indent=2)
+        save_json(perk_names_file, perk_names)
         print(f"✅ Saved perk names to {perk_names_file}")
 
         # Show some stats
@@ -0,0 +1,389 @@
+"""Tests for the pure helpers in youtube_agent.py.
+
+Run from this directory with: python -m unittest test_youtube_agent
+"""
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+from collections import deque
+from types import SimpleNamespace
+from unittest import mock
+
+# youtube_agent builds its Gemini client at import; no request is made
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+import youtube_agent  # noqa: E402
+
+
+class CleanVttTranscriptTest(unittest.TestCase):
+    def test_tag_only_cue_line_keeps_rest_of_cue(self):
+        vtt = (
+            "WEBVTT\n"
+            "\n"
+            "00:00:01.000 --> 00:00:02.000\n"
+            "<v Roger>\n"
+            "Kill clip and rampage\n"
+        )
+        self.assertEqual(youtube_agent.clean_vtt_transcript(vtt), "Kill clip and rampage")
+
+    def test_strips_inline_tags(self):
+        vtt = (
+            "WEBVTT\n"
+            "\n"
+            "00:00:01.000 --> 00:00:02.000\n"
+            "<c>hello</c><00:00:01.500><c> world</c>\n"
+        )
+        self.assertEqual(youtube_agent.clean_vtt_transcript(vtt), "hello world")
+
+    def test_timing_line_without_blank_line_starts_new_cue(self):
+        vtt = (
+            "WEBVTT\n"
+            "\n"
+            "00:00:01.000 --> 00:00:02.000\n"
+            "hello\n"
+            "00:00:02.000 --> 00:00:03.000\n"
+            "world\n"
+        )
+        self.assertEqual(youtube_agent.clean_vtt_transcript(vtt), "hello world")
+
+    def test_cue_closed_by_whitespace_only_line(self):
+        vtt = (
+            "WEBVTT\n"
+            "\n"
+            "00:00:01.000 --> 00:00:02.000\n"
+            "hello\n"
+            " \n"
+            "00:00:02.000 --> 00:00:03.000\n"
+            "world\n"
+        )
+        self.assertEqual(youtube_agent.clean_vtt_transcript(vtt), "hello world")
+
+    def test_skips_header_cue_ids_and_notes(self):
+        vtt = (
+            "WEBVTT\n"
+            "Kind: captions\n"
+            "Language: en\n"
+            "\n"
+            "NOTE generated by YouTube\n"
+            "\n"
+            "1\n"
+            "00:00:01.000 --> 00:00:02.000 align:start position:0%\n"
+            "hello\n"
+            "\n"
+            "2\n"
+            "00:00:02.000 --> 00:00:03.000\n"
+            "world\n"
+        )
+        self.assertEqual(youtube_agent.clean_vtt_transcript(vtt), "hello world")
+
+    def test_dedupes_rolling_auto_caption_lines(self):
+        vtt = (
+            "WEBVTT\n"
+            "\n"
+            "00:00:01.000 --> 00:00:02.000\n"
+            "hello\n"
+            "\n"
+            "00:00:02.000 --> 00:00:03.000\n"
+            "hello\n"
+            "world\n"
+        )
+        self.assertEqual(youtube_agent.clean_vtt_transcript(vtt), "hello world")
+
+
+class Json3TranscriptTest(unittest.TestCase):
+    def test_joins_segments_and_breaks_between_events(self):
+        json3 = (
+            '{"events": ['
+            '{"tStartMs": 0, "segs": [{"utf8": "kill"}, {"utf8": " clip"}]},'
+            '{"tStartMs": 900},'
+            '{"tStartMs": 1000, "segs": [{"utf8": "and"}, {"utf8": "\\n"}, {"utf8": "rampage"}]},'
+            '{"tStartMs": 2000, "segs": [{"tOffsetMs": 5}]}'
+            ']}'
+        )
+        self.assertEqual(youtube_agent.json3_transcript(json3), "kill clip and rampage")
+
+    def test_no_events(self):
+        self.assertEqual(youtube_agent.json3_transcript('{"wireMagic": "pb3"}'), "")
+
+
+class CutTranscriptTest(unittest.TestCase):
+    def test_short_text_is_unchanged(self):
+        self.assertEqual(youtube_agent.cut_transcript("hello world", 20), "hello world")
+
+    def test_prefers_sentence_end_near_limit(self):
+        # The sentence ends inside the last tenth, ahead of later spaces
+        text = "word " * 18 + "end. more words follow here"
+        self.assertEqual(youtube_agent.cut_transcript(text, 100), "word " * 18 + "end.")
+
+    def test_falls_back_to_last_space(self):
+        self.assertEqual(youtube_agent.cut_transcript("hello there world", 14), "hello there")
+
+    def test_never_cuts_mid_word_when_a_space_exists(self):
+        self.assertEqual(youtube_agent.cut_transcript("a" * 9 + " " + "b" * 30, 12), "a" * 9)
+
+    def test_text_without_spaces_is_cut_at_limit(self):
+        self.assertEqual(youtube_agent.cut_transcript("x" * 50, 20), "x" * 20)
+
+
+class NameLookupTest(unittest.TestCase):
+    def lookup_perk(self, name):
+        return youtube_agent.lookup_hash(
+            name, youtube_agent.PERK_LOOKUP, youtube_agent.PERK_KEYS, youtube_agent.PERK_CHOICES
+        )
+
+    def lookup_weapon(self, name):
+        return youtube_agent.lookup_hash(
+            name, youtube_agent.WEAPON_LOOKUP, youtube_agent.WEAPON_KEYS, youtube_agent.WEAPON_CHOICES
+        )
+
+    def test_exact_match(self):
+        self.assertEqual(self.lookup_perk("Kill Clip"), (youtube_agent.PERK_LOOKUP["kill clip"], True))
+
+    @unittest.skipUnless(youtube_agent.HAS_FUZZY, "rapidfuzz not installed")
+    def test_fuzzy_matches_misspellings(self):
+        self.assertEqual(self.lookup_perk("kill clp"), (youtube_agent.PERK_LOOKUP["kill clip"], False))
+        self.assertEqual(self.lookup_perk("rampge"), (youtube_agent.PERK_LOOKUP["rampage"], False))
+        self.assertEqual(self.lookup_weapon("ace of spade"), (youtube_agent.WEAPON_LOOKUP["ace of spades"], False))
+
+    @unittest.skipUnless(youtube_agent.HAS_FUZZY, "rapidfuzz not installed")
+    def test_fragments_do_not_match_longer_names(self):
+        for name in ("clip", "kill", "vorp all", "outlaw and kill clip"):
+            with self.subTest(name=name):
+                self.assertEqual(self.lookup_perk(name), (None, False))
+        self.assertEqual(self.lookup_weapon("Ace"), (None, False))
+
+    def test_batch_agrees_with_single_lookups(self):
+        # reaperecprojection scores 76.47 against crane projection and 75.68
+        # against derelict projection, which tie once rounded to integers
+        names = ["Kill Clip", "kill clp", "clip", "vorp all", "outlaw and kill clip",
+                 "reaperecprojection", ""]
+        resolved = youtube_agent.resolve_names_batch(
+            names, youtube_agent.PERK_LOOKUP, youtube_agent.PERK_KEYS, youtube_agent.PERK_CHOICES, {}
+        )
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(resolved[name], self.lookup_perk(name))
+
+
+class CallGeminiCacheTest(unittest.TestCase):
+    def call_with_response(self, text):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(youtube_agent, "RESPONSE_CACHE_DIR", cache_dir), \
+                mock.patch.object(youtube_agent, "wait_for_rate_limit"), \
+                mock.patch.object(youtube_agent, "client") as client:
+            client.models.generate_content.return_value = SimpleNamespace(text=text)
+            self.assertEqual(youtube_agent.call_gemini("prompt"), text)
+            return os.listdir(cache_dir) if os.path.isdir(cache_dir) else []
+
+    def test_saves_parseable_response(self):
+        self.assertEqual(len(self.call_with_response('[{"weapon": "Fatebringer"}]')), 1)
+
+    def test_does_not_save_unparseable_response(self):
+        self.assertEqual(self.call_with_response('[{"weapon": "Fatebr'), [])
+
+
+class AnalysisCacheTest(unittest.TestCase):
+    def test_lookup_file_digest_tracks_file_contents(self):
+        with tempfile.TemporaryDirectory() as script_dir, \
+                mock.patch.object(youtube_agent, "SCRIPT_DIR", script_dir):
+            self.assertEqual(youtube_agent.lookup_file_digest("perk_names.json"), "")
+            path = os.path.join(script_dir, "perk_names.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"1": "Rampage"}')
+            old = youtube_agent.lookup_file_digest("perk_names.json")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"1": "Rampage", "2": "Kill Clip"}')
+            self.assertNotIn(old, ("", youtube_agent.lookup_file_digest("perk_names.json")))
+
+    def test_malformed_video_index_entry_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(youtube_agent, "RESPONSE_CACHE_DIR", cache_dir):
+            key = youtube_agent.analysis_cache_key("video:abc")
+            for entry in ("not json", "[]", '{"channel": "x"}', '{"key": 5}'):
+                with self.subTest(entry=entry):
+                    youtube_agent.save_cached_analysis(key, entry)
+                    self.assertIsNone(youtube_agent.load_video_analysis("abc"))
+
+    def test_video_index_round_trip(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(youtube_agent, "RESPONSE_CACHE_DIR", cache_dir):
+            youtube_agent.save_cached_analysis("analysis-key", "[]")
+            youtube_agent.save_video_analysis("abc", "analysis-key", "Aztecross")
+            self.assertEqual(youtube_agent.load_video_analysis("abc"), ("[]", "Aztecross"))
+
+
+class ThreadYdlTest(unittest.TestCase):
+    def tearDown(self):
+        youtube_agent.close_thread_ydls()
+
+    def test_instances_get_their_own_options(self):
+        opts = {"quiet": True}
+        before = dict(opts)
+        ydl = youtube_agent.thread_ydl("test", opts)
+        self.assertIsNot(ydl.params, opts)
+        self.assertEqual(opts, before)
+        self.assertIs(youtube_agent.thread_ydl("test", opts), ydl)
+
+    def test_threads_do_not_share_instances(self):
+        opts = {"quiet": True}
+        other = []
+        thread = threading.Thread(target=lambda: other.append(youtube_agent.thread_ydl("test", opts)))
+        thread.start()
+        thread.join()
+        mine = youtube_agent.thread_ydl("test", opts)
+        self.assertIsNot(mine, other[0])
+        self.assertIsNot(mine.params, other[0].params)
+
+    def test_close_thread_ydls_closes_and_forgets_instances(self):
+        ydl = youtube_agent.thread_ydl("test", {"quiet": True})
+        with mock.patch.object(ydl, "close") as close:
+            youtube_agent.close_thread_ydls()
+        close.assert_called_once_with()
+        self.assertIsNot(youtube_agent.thread_ydl("test", {"quiet": True}), ydl)
+
+
+class BatchPass1Test(unittest.TestCase):
+    def setUp(self):
+        youtube_agent.truncate_transcript.cache_clear()
+        self.addCleanup(youtube_agent.truncate_transcript.cache_clear)
+        quiet = contextlib.redirect_stdout(io.StringIO())
+        quiet.__enter__()
+        self.addCleanup(quiet.__exit__, None, None, None)
+
+    def extract(self, response, transcripts=None):
+        transcripts = transcripts or {"0": "first video", "1": "second video"}
+        with mock.patch.object(youtube_agent, "count_tokens", return_value=10), \
+                mock.patch.object(youtube_agent, "call_gemini", return_value=response) as call:
+            return youtube_agent.batch_extract_weapons(transcripts), call
+
+    def test_maps_response_by_video_id(self):
+        weapons, call = self.extract(
+            '{"0": [{"weapon": "Fatebringer", "mode": "PvE"}], "1": []}'
+        )
+        self.assertEqual(weapons, {"0": [{"weapon": "Fatebringer", "mode": "PvE"}], "1": []})
+        prompt = call.call_args.args[0]
+        self.assertIn("<<VIDEO id=0>>\nfirst video\n<<END>>", prompt)
+        self.assertIn("<<VIDEO id=1>>\nsecond video\n<<END>>", prompt)
+
+    def test_integer_keys_are_matched_as_strings(self):
+        weapons, _ = self.extract('{"0": [], "1": [{"weapon": "Ace of Spades"}]}')
+        self.assertEqual(weapons["1"], [{"weapon": "Ace of Spades"}])
+
+    def test_drops_unknown_missing_and_malformed_entries(self):
+        weapons, _ = self.extract(
+            '{"0": {"weapon": "Fatebringer"}, "7": [{"weapon": "Outbreak"}],'
+            ' "1": ["Fatebringer", {"weapon": "The Martlet"}]}'
+        )
+        # "0" isn't a list, "7" wasn't in the batch, non-dict weapons are dropped
+        self.assertEqual(weapons, {"1": [{"weapon": "The Martlet"}]})
+
+    def test_unparseable_or_non_object_response_is_empty(self):
+        for response in ("❌ Failed after multiple retries.", "[]", '{"0": ['):
+            with self.subTest(response=response):
+                self.assertEqual(self.extract(response)[0], {})
+
+    def test_pass_one_and_two_share_the_truncated_transcript(self):
+        text = "word " * 100
+        with mock.patch.object(youtube_agent, "TRANSCRIPT_TOKEN_BUDGET", 20), \
+                mock.patch.object(youtube_agent, "count_tokens",
+                                  side_effect=lambda t: len(t) // 5) as count, \
+                mock.patch.object(youtube_agent, "call_gemini", return_value="{}") as call:
+            youtube_agent.batch_extract_weapons({"0": text, "1": "short"})
+            counts_after_pass1 = count.call_count
+            truncated = youtube_agent.truncate_transcript(text)
+        self.assertLess(len(truncated), len(text))
+        self.assertIn(f"<<VIDEO id=0>>\n{truncated}\n<<END>>", call.call_args.args[0])
+        # Pass 2's truncation reuses pass 1's instead of counting tokens again
+        self.assertEqual(count.call_count, counts_after_pass1)
+
+
+class TakePass1BatchesTest(unittest.TestCase):
+    def test_holds_partial_batch_while_downloading(self):
+        size = youtube_agent.PASS1_BATCH_SIZE
+        queue = list(range(size - 1))
+        self.assertEqual(youtube_agent.take_pass1_batches(queue, False), ([], queue))
+
+    def test_sends_full_batches_and_keeps_remainder(self):
+        size = youtube_agent.PASS1_BATCH_SIZE
+        queue = list(range(2 * size + 1))
+        batches, rest = youtube_agent.take_pass1_batches(queue, False)
+        self.assertEqual(batches, [queue[:size], queue[size:2 * size]])
+        self.assertEqual(rest, [2 * size])
+
+    def test_flushes_remainder_once_downloads_are_done(self):
+        size = youtube_agent.PASS1_BATCH_SIZE
+        queue = list(range(size + 1))
+        self.assertEqual(youtube_agent.take_pass1_batches(queue, True), ([queue[:size], [size]], []))
+        self.assertEqual(youtube_agent.take_pass1_batches([], True), ([], []))
+
+
+class RateLimiterTest(unittest.TestCase):
+    """The sliding-window limiter, on a fake clock that sleep() advances."""
+
+    def setUp(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+        for name, value in (("GEMINI_RPM", 10), ("_rpm_limit", 10), ("_call_times", deque()),
+                            ("_rpm_changed_at", 0.0), ("_throttled_until", 0.0)):
+            patcher = mock.patch.object(youtube_agent, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name, fake in (("monotonic", lambda: self.now), ("sleep", sleep)):
+            patcher = mock.patch.object(youtube_agent.time, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_full_window_waits_until_oldest_call_is_a_minute_old(self):
+        youtube_agent.GEMINI_RPM = youtube_agent._rpm_limit = 3
+        for _ in range(3):
+            youtube_agent.wait_for_rate_limit()
+            self.now += 1
+        self.assertEqual(self.sleeps, [])
+
+        youtube_agent.wait_for_rate_limit()
+        self.assertEqual(self.now, 1060.0)
+        self.assertEqual(list(youtube_agent._call_times), [1001.0, 1002.0, 1060.0])
+
+    def test_waits_out_a_throttle(self):
+        youtube_agent.throttle_gemini(15)
+        youtube_agent.wait_for_rate_limit()
+        self.assertEqual(self.now, 1015.0)
+
+    def test_only_first_429_of_a_burst_halves_the_allowance(self):
+        youtube_agent.throttle_gemini(10)
+        self.assertEqual(youtube_agent._rpm_limit, 5)
+
+        self.now += 5  # Still inside the first backoff
+        youtube_agent.throttle_gemini(20)
+        self.assertEqual(youtube_agent._rpm_limit, 5)
+        self.assertEqual(youtube_agent._throttled_until, 1025.0)
+
+        self.now = 1030.0  # A new burst
+        youtube_agent.throttle_gemini(10)
+        self.assertEqual(youtube_agent._rpm_limit, 2)
+
+    def test_allowance_regrows_one_per_quiet_minute_up_to_rpm(self):
+        youtube_agent.throttle_gemini(10)
+        self.assertEqual(youtube_agent._rpm_limit, 5)
+
+        self.now = 1059.0
+        youtube_agent.wait_for_rate_limit()
+        self.assertEqual(youtube_agent._rpm_limit, 5)
+
+        for minute in range(1, 8):
+            self.now = 1000.0 + 60 * minute
+            youtube_agent.wait_for_rate_limit()
+            self.assertEqual(youtube_agent._rpm_limit, min(5 + minute, 10))
+        self.assertEqual(self.sleeps, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
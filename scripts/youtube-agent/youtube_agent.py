@@ -9,23 +9,52 @@ Outputs:
 """
 
 import os
+import random
 import time
-import glob
+import hashlib
 import json
 import re
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 from dotenv import load_dotenv
 
 from google import genai
+from google.genai import types
 import yt_dlp
 
 # Optional: fuzzy matching for perk names
 try:
-    from rapidfuzz import fuzz, process
+    from rapidfuzz import fuzz, process, utils
     HAS_FUZZY = True
 except ImportError:
     HAS_FUZZY = False
 
+# Optional: faster JSON parsing/serialization
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Optional: numpy lets rapidfuzz score a whole batch of names in one cdist call
+try:
+    import numpy  # noqa: F401 - only needed by process.cdist
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Optional: HTTP/2 lets concurrent Gemini calls share one multiplexed connection
+try:
+    import h2  # noqa: F401  (only needs to be importable for httpx)
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
 # Load Environment Variables
 load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
@@ -33,26 +62,74 @@ API_KEY = os.getenv("GEMINI_API_KEY")
 if not API_KEY:
     raise ValueError("❌ No API Key found! Check your .env file.")
 
-client = genai.Client(api_key=API_KEY)
+client = genai.Client(
+    api_key=API_KEY,
+    http_options=types.HttpOptions(client_args={'http2': True}) if HAS_HTTP2 else None,
+)
 
 # --- CONFIGURATION ---
 MODEL_NAME = "gemini-3-flash-preview"  # Best reasoning model
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, 'output')
+DOWNLOAD_WORKERS = 4  # Subtitle downloads running at once
+ANALYZE_WORKERS = 2  # Videos being analyzed by Gemini at once (calls are still rate limited)
+PASS2_WORKERS = 3  # Per-weapon pass-2 calls in flight per video
+PASS1_BATCH_SIZE = 4  # Videos whose pass-1 weapon extraction shares one Gemini call
+GEMINI_RPM = 10  # Gemini requests per minute, shared across all workers
+GEMINI_MAX_IN_FLIGHT = 4  # Gemini requests awaiting a response at once, across all workers
+PROMPT_CACHE_TTL = 3600  # Seconds to keep the static prompts in Gemini's context cache
+TRANSCRIPT_CACHE_TTL = 300  # Seconds to keep one video's transcript cached for its pass-2 calls
+TRANSCRIPT_TOKEN_BUDGET = 8000  # Max transcript tokens sent to Gemini per prompt
+RESPONSE_CACHE_DIR = os.path.join(SCRIPT_DIR, '.gemini_cache')  # Analyses and Gemini responses already seen
 
 # --- LOOKUP DATA ---
 def load_lookup(filename):
     """Load a JSON lookup file."""
     path = os.path.join(SCRIPT_DIR, filename)
     if os.path.exists(path):
+        if HAS_ORJSON:
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
         with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
     return {}
 
-PERK_LOOKUP = load_lookup('perk_lookup.json')
-WEAPON_LOOKUP = load_lookup('weapon_lookup.json')
+def normalize_lookup(lookup):
+    """Lowercase and strip every key so queries only need normalizing once."""
+    return {k.lower().strip(): v for k, v in lookup.items()}
+
+PERK_LOOKUP = normalize_lookup(load_lookup('perk_lookup.json'))
+WEAPON_LOOKUP = normalize_lookup(load_lookup('weapon_lookup.json'))
 WEAPON_PERK_POOLS = load_lookup('weapon_perk_pools.json')
-PERK_NAMES = load_lookup('perk_names.json')
+# Lookup keys as plain lists, plus the same keys run through rapidfuzz's
+# default_process (lowercase, punctuation to spaces) once here so fuzzy
+# matching never re-processes thousands of choices per query
+PERK_KEYS = list(PERK_LOOKUP)
+WEAPON_KEYS = list(WEAPON_LOOKUP)
+PERK_CHOICES = [utils.default_process(k) for k in PERK_KEYS] if HAS_FUZZY else PERK_KEYS
+WEAPON_CHOICES = [utils.default_process(k) for k in WEAPON_KEYS] if HAS_FUZZY else WEAPON_KEYS
+# Resolved (hash, exact) per normalized name, shared by every output format
+_perk_matches = {}
+_weapon_matches = {}
+# Perk pools by lowercase weapon name (first pool wins for duplicate names,
+# matching the old linear scan), plus the names as fuzzy-match choices
+POOLS_BY_NAME = {}
+for _pool in WEAPON_PERK_POOLS.values():
+    POOLS_BY_NAME.setdefault(_pool.get('name', '').lower(), _pool)
+POOL_NAMES = list(POOLS_BY_NAME)
+POOL_CHOICES = [utils.default_process(n) for n in POOL_NAMES] if HAS_FUZZY else POOL_NAMES
+# Fuzzy-matched pool (or None) per lowercase weapon name from pass 1
+_pool_matches = {}
+# JSON object keys are always strings; re-key by int so the int hashes in
+# WEAPON_PERK_POOLS can be looked up directly
+PERK_NAMES = {int(k): v for k, v in load_lookup('perk_names.json').items()}
+
+# Wishlist tags per roll mode, built once instead of per roll
+DIM_MODE_TAGS = {'PvE': 'pve', 'PvP': 'pvp', 'Both': 'pve,pvp'}
+LITTLELIGHT_MODE_TAGS = {'PvE': ('GodPVE',), 'PvP': ('GodPVP',), 'Both': ('GodPVE', 'GodPVP')}
+
+# Perk columns of a roll, in wishlist order
+PERK_COLUMNS = ('barrel', 'magazine', 'trait1', 'trait2')
 
 # --- PROMPT ---
 GOD_ROLL_PROMPT = """
@@ -139,9 +216,43 @@ If no weapons are recommended, return: []
 TRANSCRIPT:
 """
 
-CONSTRAINED_ROLL_PROMPT = """
+BATCH_WEAPON_EXTRACT_PROMPT = """
+You are a Destiny 2 expert. Below are several video transcripts, each between
+<<VIDEO id=...>> and <<END>> markers. Treat every video independently and, for
+each one, extract ONLY the weapon names being recommended.
+
+RULES:
+1. Extract only the PRIMARY weapon(s) being recommended, NOT comparison weapons
+2. Creators often say "this is better than X" - ignore X, extract only the main weapon
+3. Include "The" prefix if the weapon has it (e.g., "The Martlet")
+4. Use the EXACT weapon name as spoken
+5. Return weapon names and their recommended mode (PvE/PvP/Both)
+6. Never mix weapons between videos
+
+OUTPUT FORMAT - Return ONLY valid JSON, an object keyed by video id:
+{
+  "0": [{"weapon": "Exact Weapon Name", "mode": "PvE" | "PvP" | "Both"}],
+  "1": []
+}
+
+Include every video id; use [] for a video with no recommended weapons.
+
+TRANSCRIPTS:
+"""
+
+# Pass 2 sends the transcript first and the per-weapon instructions after it,
+# so every weapon call for a video shares the same prefix (and, with two or
+# more weapons, the same context cache)
+CONSTRAINED_TRANSCRIPT_PREFIX = """
 You are a Destiny 2 expert analyzing a video transcript for god roll recommendations.
 
+TRANSCRIPT:
+"""
+
+CONSTRAINED_ROLL_PROMPT = """
+
+Extract the god roll for ONE weapon from the transcript above.
+
 WEAPON: {weapon_name}
 MODE: {mode}
 
@@ -171,11 +282,28 @@ RULES:
 3. If creator says "X or Y", include both if they're in the valid list
 4. Extract the timestamp where this roll is discussed
 5. Explain WHY these perks work together in the reasoning field
-
-TRANSCRIPT:
 """
 
 
+def perk_pool_names(pool):
+    """Convert a weapon's perk pool hashes to perk names, column by column."""
+    def hashes_to_names(hash_list):
+        names = []
+        for h in hash_list:
+            name = PERK_NAMES.get(h)
+            if name:
+                names.append(name)
+        return names
+
+    return {
+        'barrels': hashes_to_names(pool.get('barrels', [])),
+        'magazines': hashes_to_names(pool.get('magazines', [])),
+        'trait1': hashes_to_names(pool.get('trait1', [])),
+        'trait2': hashes_to_names(pool.get('trait2', [])),
+        'origin': hashes_to_names(pool.get('origin', []))
+    }
+
+
 def get_valid_perks_for_weapon(weapon_name):
     """Get valid perk names for a weapon from the perk pool data."""
     if not WEAPON_PERK_POOLS or not PERK_NAMES:
@@ -184,55 +312,59 @@ def get_valid_perks_for_weapon(weapon_name):
     # Find weapon in perk pools by name (case-insensitive)
     weapon_name_lower = weapon_name.lower().strip()
 
-    for weapon_hash, pool in WEAPON_PERK_POOLS.items():
-        if pool.get('name', '').lower() == weapon_name_lower:
-            # Convert perk hashes to names
-            def hashes_to_names(hash_list):
-                names = []
-                for h in hash_list:
-                    name = PERK_NAMES.get(str(h)) or PERK_NAMES.get(h)
-                    if name:
-                        names.append(name)
-                return names
-
-            return {
-                'barrels': hashes_to_names(pool.get('barrels', [])),
-                'magazines': hashes_to_names(pool.get('magazines', [])),
-                'trait1': hashes_to_names(pool.get('trait1', [])),
-                'trait2': hashes_to_names(pool.get('trait2', [])),
-                'origin': hashes_to_names(pool.get('origin', []))
-            }
-
-    # Try fuzzy match if exact match fails
-    if HAS_FUZZY:
-        pool_names = {pool['name'].lower(): (h, pool) for h, pool in WEAPON_PERK_POOLS.items()}
-        result = process.extractOne(weapon_name_lower, pool_names.keys(), scorer=fuzz.token_sort_ratio)
-        if result and result[1] >= 75:
-            matched_name = result[0]
-            weapon_hash, pool = pool_names[matched_name]
-
-            def hashes_to_names(hash_list):
-                names = []
-                for h in hash_list:
-                    name = PERK_NAMES.get(str(h)) or PERK_NAMES.get(h)
-                    if name:
-                        names.append(name)
-                return names
-
-            return {
-                'barrels': hashes_to_names(pool.get('barrels', [])),
-                'magazines': hashes_to_names(pool.get('magazines', [])),
-                'trait1': hashes_to_names(pool.get('trait1', [])),
-                'trait2': hashes_to_names(pool.get('trait2', [])),
-                'origin': hashes_to_names(pool.get('origin', []))
-            }
+    pool = POOLS_BY_NAME.get(weapon_name_lower)
+    if pool is not None:
+        return perk_pool_names(pool)
+
+    # Try fuzzy match if exact match fails; the same weapon often comes up in
+    # several videos of a playlist, so each name is only scanned once
+    if HAS_FUZZY and POOL_NAMES:
+        if weapon_name_lower not in _pool_matches:
+            result = process.extractOne(utils.default_process(weapon_name_lower), POOL_CHOICES,
+                                        scorer=fuzz.token_sort_ratio, score_cutoff=75)
+            _pool_matches[weapon_name_lower] = POOLS_BY_NAME[POOL_NAMES[result[2]]] if result else None
+        pool = _pool_matches[weapon_name_lower]
+        if pool is not None:
+            return perk_pool_names(pool)
 
     return None
 
 
+# The list= query parameter of a YouTube URL; group 1 is the playlist ID
+_PLAYLIST_RE = re.compile(r'[?&]list=([A-Za-z0-9_-]+)')
+
 def is_playlist_url(url):
     """Check if URL is a playlist or single video."""
-    return 'list=' in url
+    # Shorts are always single videos, and Watch Later (WL) is private, so a
+    # video opened from it should be treated as just that video
+    if '/shorts/' in url:
+        return False
+    match = _PLAYLIST_RE.search(url)
+    return bool(match) and match.group(1) != 'WL'
+
+
+# yt-dlp option sets, built once rather than per call
+_PLAYLIST_YDL_OPTS = {
+    'extract_flat': 'in_playlist',
+    'quiet': True,
+    'ignoreerrors': True,
+}
+_META_YDL_OPTS = {
+    'skip_download': True,
+    'quiet': True,
+    'no_warnings': True,
+}
+_SUBS_YDL_OPTS = {
+    'skip_download': True,
+    'writesubtitles': True,
+    'writeautomaticsub': True,
+    'subtitleslangs': ['en'],
+    # json3 is YouTube's native caption format: plain text segments with no
+    # markup or rolling repeats to clean up. VTT is the fallback.
+    'subtitlesformat': 'json3/vtt',
+    'quiet': True,
+    'no_warnings': True,
+}
 
 
 def get_single_video(video_url):
@@ -263,13 +395,12 @@ def get_single_video(video_url):
 def get_playlist_videos(playlist_url):
     """Extract video info from a YouTube playlist."""
     print(f"\n🔍 Scanning playlist...")
-    ydl_opts = {
-        'extract_flat': 'in_playlist',
-        'quiet': True,
-        'ignoreerrors': True,
-    }
+    # Go straight to the playlist page, even for a watch?v=...&list=... link
+    match = _PLAYLIST_RE.search(playlist_url)
+    if match:
+        playlist_url = f"https://www.youtube.com/playlist?list={match.group(1)}"
     video_data = []
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    with yt_dlp.YoutubeDL(dict(_PLAYLIST_YDL_OPTS)) as ydl:
         info = ydl.extract_info(playlist_url, download=False)
         if 'entries' in info:
             for entry in info['entries']:
@@ -284,38 +415,70 @@ def get_playlist_videos(playlist_url):
     return video_data
 
 
+_ydl_local = threading.local()
+# Every instance thread_ydl has created, so they can be closed at the end
+_thread_ydls_lock = threading.Lock()
+_thread_ydls = []
+
+
+def thread_ydl(name, ydl_opts):
+    """Return this thread's YoutubeDL for an option set, creating it on first use.
+
+    Building a YoutubeDL loads every extractor, so each worker thread keeps
+    one per option set instead of constructing it per video. Instances are
+    not shared between threads, and each gets its own copy of the options
+    because YoutubeDL keeps and writes into the dict it is given.
+    """
+    ydl = getattr(_ydl_local, name, None)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL(dict(ydl_opts))
+        setattr(_ydl_local, name, ydl)
+        with _thread_ydls_lock:
+            _thread_ydls.append(ydl)
+    return ydl
+
+
+def close_thread_ydls():
+    """Close every YoutubeDL made by thread_ydl, once the worker pools are done."""
+    with _thread_ydls_lock:
+        ydls = _thread_ydls[:]
+        _thread_ydls.clear()
+    for ydl in ydls:
+        ydl.close()
+    # The calling thread may have built its own (single-video lookup); drop
+    # those so a later call gets a fresh instance
+    _ydl_local.__dict__.clear()
+
+
 def get_video_metadata(video_url):
     """Get full video metadata including channel name."""
-    ydl_opts = {
-        'skip_download': True,
-        'quiet': True,
-        'no_warnings': True,
-    }
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video_url, download=False)
-            return {
-                'channel': info.get('channel') or info.get('uploader') or 'Unknown',
-                'title': info.get('title', 'Unknown Video'),
-                'id': info.get('id'),
-            }
+        ydl = thread_ydl('meta', _META_YDL_OPTS)
+        return metadata_from_info(ydl.extract_info(video_url, download=False))
     except Exception:
         return None
 
 
+def metadata_from_info(info):
+    """Pick the fields we use out of a yt-dlp info dict."""
+    return {
+        'channel': info.get('channel') or info.get('uploader') or 'Unknown',
+        'title': info.get('title', 'Unknown Video'),
+        'id': info.get('id'),
+    }
+
+
+# MM:SS or HH:MM:SS, tolerating surrounding whitespace
+_TIMESTAMP_RE = re.compile(r'^\s*(?:(\d+):)?(\d+):(\d+)\s*$')
+
+@lru_cache(maxsize=4096)
 def timestamp_to_seconds(timestamp_str):
     """Convert MM:SS or HH:MM:SS to seconds."""
-    if not timestamp_str:
+    match = _TIMESTAMP_RE.match(timestamp_str) if timestamp_str else None
+    if not match:
         return None
-    parts = timestamp_str.strip().split(':')
-    try:
-        if len(parts) == 2:
-            return int(parts[0]) * 60 + int(parts[1])
-        elif len(parts) == 3:
-            return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-    except ValueError:
-        pass
-    return None
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
 
 
 def build_timestamped_url(video_id, timestamp_str):
@@ -326,88 +489,229 @@ def build_timestamped_url(video_id, timestamp_str):
         return f"{base_url}&t={seconds}s"
     return base_url
 
+# Inline tags (<c>, </c>, <00:00:01.234>); never spans lines, like a per-line strip
+_VTT_TAG_RE = re.compile(r'<[^>\n]+>')
+# Auto-captions repeat each phrase across a few neighbouring cues, so only
+# the most recent lines need remembering for dedupe
+VTT_DEDUPE_WINDOW = 64
+
+# clean_vtt_transcript parser states
+_VTT_HEADER, _VTT_BETWEEN_CUES, _VTT_CUE_TEXT = range(3)
+
 def clean_vtt_transcript(vtt_content):
-    """Clean VTT subtitle format to plain text."""
-    lines = vtt_content.split('\n')
-    seen_lines = set()
+    """Clean VTT subtitle format to plain text.
+
+    The file is walked as header -> (timing line -> cue text -> blank line)*,
+    so only cue text lines are tag-stripped and deduped; the header, cue
+    identifiers and NOTE/STYLE blocks are skipped by state alone.
+    """
+    window = deque(maxlen=VTT_DEDUPE_WINDOW)
+    window_set = set()
     clean_lines = []
+    state = _VTT_HEADER
 
-    for line in lines:
-        # Skip VTT header, timing lines, and empty lines
-        if line.startswith('WEBVTT') or line.startswith('Kind:') or line.startswith('Language:'):
+    for line in vtt_content.splitlines():
+        # A timing line always starts a new cue, even when the previous one
+        # wasn't closed by a blank line
+        if '-->' in line:
+            state = _VTT_CUE_TEXT
             continue
-        if '-->' in line:  # Timing line
+
+        if state != _VTT_CUE_TEXT:
+            # Everything else outside a cue (WEBVTT/Kind:/Language: header,
+            # cue IDs, NOTE blocks) is skipped
+            if state == _VTT_HEADER and not line.strip():
+                state = _VTT_BETWEEN_CUES
             continue
-        if not line.strip():
+
+        # Only a truly empty raw line ends a cue; YouTube auto-captions put
+        # whitespace-only lines inside cues, and a line holding only a tag
+        # (<v Roger>) is still part of the cue
+        if not line:
+            state = _VTT_BETWEEN_CUES
             continue
-        if line.strip().startswith('NOTE'):
+        clean_line = (_VTT_TAG_RE.sub('', line) if '<' in line else line).strip()
+        if not clean_line:
             continue
 
-        # Remove HTML-like tags (e.g., <c>, </c>, <00:00:01.234>)
-        clean_line = re.sub(r'<[^>]+>', '', line)
-        clean_line = clean_line.strip()
-
-        # Skip duplicate lines (VTT often repeats lines)
-        if clean_line and clean_line not in seen_lines:
-            seen_lines.add(clean_line)
-            clean_lines.append(clean_line)
+        # Skip lines repeated by the rolling caption window
+        if clean_line in window_set:
+            continue
+        if len(window) == VTT_DEDUPE_WINDOW:
+            window_set.discard(window[0])
+        window.append(clean_line)
+        window_set.add(clean_line)
+        clean_lines.append(clean_line)
 
     return ' '.join(clean_lines)
 
 
+def json3_transcript(json3_content):
+    """Flatten YouTube json3 captions to plain text."""
+    data = orjson.loads(json3_content) if HAS_ORJSON else json.loads(json3_content)
+    # Segments within an event carry their own spacing; events are separate
+    # cues, so break between them and then collapse all whitespace
+    text = '\n'.join(
+        ''.join(seg.get('utf8', '') for seg in event['segs'])
+        for event in data.get('events', ())
+        if event.get('segs')
+    )
+    return ' '.join(text.split())
+
+
 def get_transcript_with_ytdlp(video_url):
-    """Download subtitles for a video using yt-dlp."""
-    temp_filename = "temp_subs"
-
-    ydl_opts = {
-        'skip_download': True,
-        'writesub': True,
-        'writeautomaticsub': True,
-        'subtitleslangs': ['en'],
-        'subtitlesformat': 'vtt',
-        'outtmpl': temp_filename,
-        'quiet': True,
-        'no_warnings': True,
-    }
+    """Fetch English subtitles for a video using yt-dlp, entirely in memory.
 
+    Returns (transcript, metadata); the metadata comes from the same
+    extract_info call, so callers don't need a second lookup for the channel.
+    Either value is None if it couldn't be fetched.
+    """
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([video_url])
+        ydl = thread_ydl('subs', _SUBS_YDL_OPTS)
+        info = ydl.extract_info(video_url, download=False)
+        metadata = metadata_from_info(info)
+        sub = (info.get('requested_subtitles') or {}).get('en')
+        if not sub:
+            return None, metadata
+
+        # yt-dlp already picked the best 'en' track in the requested format;
+        # fetch it through the same opener instead of writing it to disk
+        if sub.get('data'):
+            content = sub['data']
+        elif sub.get('url'):
+            content = ydl.urlopen(sub['url']).read().decode('utf-8', 'replace')
+        else:
+            return None, metadata
 
-        files = glob.glob(f"{temp_filename}*.vtt")
-        if not files:
-            return None
+        if sub.get('ext') == 'json3':
+            return json3_transcript(content), metadata
+        # Clean VTT to plain text
+        return clean_vtt_transcript(content), metadata
+    except Exception:
+        return None, None
 
-        with open(files[0], 'r', encoding='utf-8') as f:
-            vtt_content = f.read()
+_rate_lock = threading.Lock()
+_call_times = deque()  # Start times of Gemini calls made in the last minute
+_rpm_limit = GEMINI_RPM  # Current allowance: halved on 429, regrows by 1 per quiet minute
+_rpm_changed_at = 0.0
+_throttled_until = 0.0
 
-        # Cleanup temp files
-        for f in files:
-            try:
-                os.remove(f)
-            except:
-                pass
 
-        # Clean VTT to plain text
-        return clean_vtt_transcript(vtt_content)
-    except Exception:
-        return None
+def wait_for_rate_limit():
+    """Block until the next Gemini call fits under the current RPM allowance.
+
+    A sliding one-minute window shared by all worker threads: calls go out
+    immediately while the window has room and only wait when it is full (or
+    while a 429 backoff is in force), sleeping outside the lock.
+    """
+    global _rpm_limit, _rpm_changed_at
+    while True:
+        with _rate_lock:
+            now = time.monotonic()
+            # Additive increase back towards GEMINI_RPM after a cut
+            if _rpm_limit < GEMINI_RPM and now - _rpm_changed_at >= 60:
+                _rpm_limit += 1
+                _rpm_changed_at = now
+            while _call_times and now - _call_times[0] >= 60:
+                _call_times.popleft()
+            window_full = len(_call_times) >= _rpm_limit
+            if now >= _throttled_until and not window_full:
+                _call_times.append(now)
+                return
+            wait = max(_throttled_until - now, _call_times[0] + 60 - now if window_full else 0)
+        time.sleep(wait)
+
+
+def throttle_gemini(seconds):
+    """Hold every worker's next Gemini call back by at least seconds.
+
+    Used after a 429 so all threads back off together instead of each
+    sleeping on its own and retrying into the same quota wall. The first 429
+    of a burst also halves the RPM allowance (multiplicative decrease).
+    """
+    global _rpm_limit, _rpm_changed_at, _throttled_until
+    with _rate_lock:
+        now = time.monotonic()
+        if now >= _throttled_until:
+            _rpm_limit = max(1, _rpm_limit // 2)
+            _rpm_changed_at = now
+        _throttled_until = max(_throttled_until, now + seconds)
+
+
+# retryDelay in a 429's RetryInfo detail, e.g. 'retryDelay': '37s'
+_RETRY_DELAY_RE = re.compile(r"""retryDelay['"]?\s*:\s*['"]?(\d+(?:\.\d+)?)s""")
+
+
+def retry_after_seconds(error):
+    """Server-suggested wait for a 429, or None if the error doesn't carry one.
+
+    Checks a Retry-After header on the HTTP response first, then the
+    RetryInfo detail Gemini puts in the error body.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        try:
+            return float(headers.get('retry-after') or headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            pass
+    match = _RETRY_DELAY_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+# Caps concurrent requests however the worker pools nest (analysis x pass 2),
+# so a burst of slow responses can't pile up more open calls than this
+_gemini_slots = threading.BoundedSemaphore(GEMINI_MAX_IN_FLIGHT)
+
+
+def call_cache_key(prompt, cached_prefix=''):
+    """Disk cache key for one Gemini call, the same whether or not the prefix went via a context cache."""
+    h = hashlib.sha256(f"{MODEL_NAME}\0call\0".encode('utf-8'))
+    h.update(cached_prefix.encode('utf-8'))
+    h.update(prompt.encode('utf-8'))
+    return h.hexdigest()
+
 
-def call_gemini(prompt, max_retries=5, base_wait=15):
-    """Call Gemini API with retry logic."""
+def call_gemini(prompt, max_retries=5, base_wait=15, cached_content=None, cached_prefix=''):
+    """Call Gemini API with retry logic.
+
+    With cached_content, prompt is only the new text sent after the cached
+    prefix, and cached_prefix is the text that cache holds. Successful
+    responses are saved to disk, so a prompt already answered (e.g. on a
+    re-run after an interrupted playlist) never reaches the API again.
+    """
+    key = call_cache_key(prompt, cached_prefix)
+    cached = load_cached_analysis(key)
+    if cached is not None:
+        return cached
+
+    config = types.GenerateContentConfig(cached_content=cached_content) if cached_content else None
     for attempt in range(max_retries):
+        wait_for_rate_limit()
         try:
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt
-            )
+            with _gemini_slots:
+                response = client.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=prompt,
+                    config=config
+                )
+            # Only answers that parse are kept; a garbled one is retried on
+            # the next run instead of being replayed forever
+            if response.text and parse_gemini_response(response.text) is not None:
+                save_cached_analysis(key, response.text)
             return response.text
         except Exception as e:
             error_str = str(e)
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                wait_time = base_wait * (attempt + 1)
-                print(f"      ⏳ Rate limited. Waiting {wait_time}s...")
-                time.sleep(wait_time)
+            if getattr(e, 'code', None) == 429 or "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
+                # Exponential backoff with jitter, capped at a minute, but never
+                # shorter than the server asked for; the wait itself happens in
+                # wait_for_rate_limit on the next attempt
+                wait_time = random.uniform(0.5, min(60.0, base_wait * 2 ** attempt))
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    wait_time = max(wait_time, retry_after + random.uniform(0, 1))
+                print(f"      ⏳ Rate limited. Waiting {wait_time:.0f}s...")
+                throttle_gemini(wait_time)
             elif "404" in error_str:
                 return f"❌ Model '{MODEL_NAME}' not found. Check model name."
             else:
@@ -415,103 +719,439 @@ def call_gemini(prompt, max_retries=5, base_wait=15):
     return "❌ Failed after multiple retries."
 
 
-def analyze_transcript(text_content, video_title):
-    """Use Gemini to extract god rolls from transcript using two-pass validation."""
-    print(f"   🧠 Analyzing: {video_title}...")
+_prompt_cache_lock = threading.Lock()
+# Gemini context caches per static prompt: {prompt: {'name', 'expires_at', 'unavailable'}}
+_prompt_caches = {}
+
+
+def get_prompt_cache_name(prompt):
+    """Get the Gemini context cache holding a static prompt, creating it when needed.
+
+    Each cache is shared by every call using that prompt so the instructions
+    and examples are encoded once instead of once per video. Returns None if
+    the cache can't be created (e.g. the prompt is below the model's minimum
+    cacheable size); callers then send the prompt inline.
+    """
+    with _prompt_cache_lock:
+        entry = _prompt_caches.setdefault(prompt, {'name': None, 'expires_at': 0.0, 'unavailable': False})
+        if entry['unavailable']:
+            return None
+        # Refresh a minute early so in-flight calls never reference an expired cache
+        if entry['name'] and time.monotonic() < entry['expires_at'] - 60:
+            return entry['name']
+        try:
+            cache = client.caches.create(
+                model=MODEL_NAME,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=prompt,
+                    ttl=f"{PROMPT_CACHE_TTL}s",
+                )
+            )
+        except Exception as e:
+            print(f"      ℹ️  Prompt caching unavailable, sending prompt inline ({e})")
+            entry['unavailable'] = True
+            return None
+        entry['name'] = cache.name
+        entry['expires_at'] = time.monotonic() + PROMPT_CACHE_TTL
+        return cache.name
+
+
+def release_prompt_caches():
+    """Delete the prompt context caches instead of paying for them until TTL expiry."""
+    with _prompt_cache_lock:
+        for entry in _prompt_caches.values():
+            if entry['name']:
+                try:
+                    client.caches.delete(name=entry['name'])
+                except Exception:
+                    pass
+                entry['name'] = None
+
+
+def call_cached_prompt(prompt, transcript):
+    """Run a static prompt over a transcript, sending the prompt via its context cache."""
+    cache_name = get_prompt_cache_name(prompt)
+    if cache_name:
+        response = call_gemini(transcript, cached_content=cache_name, cached_prefix=prompt)
+        if not (response.startswith("❌") or response.startswith("⚠️")):
+            return response
+        # Cache may have been evicted server-side; drop it and go inline
+        with _prompt_cache_lock:
+            entry = _prompt_caches[prompt]
+            if entry['name'] == cache_name:
+                entry['name'] = None
+    return call_gemini(prompt + transcript)
+
+
+def create_transcript_cache(transcript):
+    """Cache a video's pass-2 prefix (instructions plus transcript) for its per-weapon calls.
+
+    Returns the cache name, or None when caching is unavailable or the
+    transcript is too short to be cached; callers then send it inline.
+    """
+    try:
+        cache = client.caches.create(
+            model=MODEL_NAME,
+            config=types.CreateCachedContentConfig(
+                contents=[CONSTRAINED_TRANSCRIPT_PREFIX + transcript],
+                ttl=f"{TRANSCRIPT_CACHE_TTL}s",
+            )
+        )
+    except Exception as e:
+        print(f"      ℹ️  Transcript caching unavailable, sending it per weapon ({e})")
+        return None
+    return cache.name
+
+
+def release_transcript_cache(cache_name):
+    """Delete a video's transcript cache once its pass-2 calls are done."""
+    try:
+        client.caches.delete(name=cache_name)
+    except Exception:
+        pass
+
+
+def load_cached_analysis(key):
+    """Return a previously saved analysis for this cache key, or None."""
+    path = os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def save_cached_analysis(key, response_text):
+    """Save an analysis atomically so concurrent or interrupted runs never see a partial file."""
+    os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(response_text)
+    os.replace(temp_path, path)
+
+
+def lookup_file_digest(filename):
+    """sha256 of a lookup file's bytes, or '' if it doesn't exist."""
+    path = os.path.join(SCRIPT_DIR, filename)
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# Everything besides the transcript that shapes an analysis; changing any of
+# it gives saved analyses new keys so stale answers are never reused. The
+# perk pools feed the pass-2 prompts, so a refreshed season invalidates too.
+ANALYSIS_CACHE_SALT = hashlib.sha256('\0'.join([
+    MODEL_NAME, GOD_ROLL_PROMPT, WEAPON_EXTRACT_PROMPT, BATCH_WEAPON_EXTRACT_PROMPT,
+    CONSTRAINED_TRANSCRIPT_PREFIX, CONSTRAINED_ROLL_PROMPT,
+    str(TRANSCRIPT_TOKEN_BUDGET), str(bool(WEAPON_PERK_POOLS and PERK_NAMES)),
+    lookup_file_digest('weapon_perk_pools.json'), lookup_file_digest('perk_names.json'),
+]).encode('utf-8')).hexdigest()
+
+
+def analysis_cache_key(text):
+    """Cache key for an analysis of text under the current model and prompts."""
+    return hashlib.sha256(f"{ANALYSIS_CACHE_SALT}\0{text}".encode('utf-8')).hexdigest()
+
+
+def load_video_analysis(video_id):
+    """Return (analysis, channel) saved for a video ID, or None.
+
+    Lets a re-run skip the subtitle download for videos it already analyzed.
+    """
+    if not video_id:
+        return None
+    entry = load_cached_analysis(analysis_cache_key(f"video:{video_id}"))
+    if entry is None:
+        return None
+    # A damaged index entry just means the video is analyzed again
+    try:
+        entry = json.loads(entry)
+        key = entry['key']
+        channel = entry.get('channel', '')
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    if not isinstance(key, str):
+        return None
+    analysis = load_cached_analysis(key)
+    if analysis is None:
+        return None
+    return analysis, channel
+
+
+def save_video_analysis(video_id, key, channel):
+    """Remember which saved analysis belongs to a video ID."""
+    if video_id:
+        save_cached_analysis(analysis_cache_key(f"video:{video_id}"),
+                             json.dumps({'key': key, 'channel': channel}))
+
+
+def count_tokens(text):
+    """Count Gemini tokens in text, or None if the count call fails."""
+    try:
+        return client.models.count_tokens(model=MODEL_NAME, contents=text).total_tokens
+    except Exception:
+        return None
+
+
+# End of a sentence followed by whitespace; captions often have no
+# punctuation, so cuts fall back to the last space
+_SENTENCE_END_RE = re.compile(r'[.!?]\s')
+
+
+def cut_transcript(text, limit):
+    """Cut text to at most limit chars, ending on a sentence or word boundary.
+
+    A sentence end in the last tenth of the kept text is preferred; otherwise
+    the cut falls on the last space before limit. Only text with no space
+    before limit at all is cut mid-word.
+    """
+    if len(text) <= limit:
+        return text
+    floor = limit - limit // 10
+    end = None
+    for end in _SENTENCE_END_RE.finditer(text, floor, limit + 1):
+        pass
+    if end is not None:
+        return text[:end.start() + 1]
+    space = text.rfind(' ', 0, limit + 1)
+    return text[:space] if space > 0 else text[:limit]
+
+
+# Batched pass 1 and the later per-video pass 2 both truncate the same
+# transcript; remembering recent results gives them the same text without
+# repeating the count_tokens calls
+@lru_cache(maxsize=PASS1_BATCH_SIZE * 4)
+def truncate_transcript(text_content, max_counts=3):
+    """Cut a transcript down to TRANSCRIPT_TOKEN_BUDGET Gemini tokens.
+
+    Each cut is proportional to the measured chars-per-token ratio and then
+    re-counted, so the result lands just under budget in at most max_counts
+    count_tokens calls, made once per video before any retries.
+    """
+    # Rough cap first (a token is ~4 chars) so huge transcripts aren't sent
+    # whole just to be counted
+    text_content = cut_transcript(text_content, TRANSCRIPT_TOKEN_BUDGET * 8)
+
+    for _ in range(max_counts):
+        tokens = count_tokens(text_content)
+        if tokens is None:
+            return cut_transcript(text_content, TRANSCRIPT_TOKEN_BUDGET * 4)
+        if tokens <= TRANSCRIPT_TOKEN_BUDGET:
+            return text_content
+        # Token density is roughly even through a transcript, so cut
+        # proportionally, with a little slack so the recount usually passes
+        text_content = cut_transcript(text_content, len(text_content) * TRANSCRIPT_TOKEN_BUDGET * 97 // (tokens * 100))
+    return text_content
+
+
+def has_saved_analysis(text_content):
+    """Whether analyze_transcript would answer this transcript from disk."""
+    return os.path.exists(os.path.join(RESPONSE_CACHE_DIR, f"{analysis_cache_key(text_content)}.json"))
+
+
+def batch_extract_weapons(transcripts):
+    """Run pass 1 for several videos in one Gemini call.
+
+    transcripts maps a batch id to transcript text. Returns {batch_id: weapons}
+    for every video the response answered cleanly; callers run the normal
+    per-video pass 1 for any id that is missing.
+    """
+    print(f"   📋 Pass 1: Extracting weapons for {len(transcripts)} videos in one call...")
+    # The same token-budget cut pass 2 will see, so weapons discussed near the
+    # end of a sparse transcript are extracted either way
+    blocks = ''.join(
+        f"<<VIDEO id={batch_id}>>\n{truncate_transcript(text)}\n<<END>>\n"
+        for batch_id, text in transcripts.items()
+    )
+    # The instructions are too short for a context cache, so they go inline
+    response = parse_gemini_response(call_gemini(BATCH_WEAPON_EXTRACT_PROMPT + blocks))
+    if not isinstance(response, dict):
+        print("   ⚠️  Batched pass 1 failed, extracting weapons per video")
+        return {}
+    return {
+        batch_id: [w for w in weapons if isinstance(w, dict)]
+        for batch_id, weapons in ((str(k), v) for k, v in response.items())
+        if batch_id in transcripts and isinstance(weapons, list)
+    }
+
+
+def take_pass1_batches(queue, downloads_done):
+    """Split queued pass-1 jobs into the batches that are ready to send.
+
+    Full batches of PASS1_BATCH_SIZE go out as soon as they fill; once
+    downloads are done, the remainder goes out too. Returns (batches, still_queued).
+    """
+    batches = []
+    while len(queue) >= PASS1_BATCH_SIZE or (queue and downloads_done):
+        batches.append(queue[:PASS1_BATCH_SIZE])
+        queue = queue[PASS1_BATCH_SIZE:]
+    return batches, queue
+
+
+def analyze_transcript(text_content, video_info, weapons=None):
+    """Use Gemini to extract god rolls from transcript, reusing saved analyses of identical transcripts.
+
+    weapons, when given, is this video's pass-1 result from a batched call.
+    """
+    print(f"   🧠 Analyzing: {video_info['title']}...")
+
+    # Keyed on the full transcript so a saved analysis is found before any
+    # token counting call is made
+    cache_key = analysis_cache_key(text_content)
+    cached = load_cached_analysis(cache_key)
+    if cached is not None:
+        print("      ♻️  Using saved analysis for this transcript")
+        save_video_analysis(video_info['id'], cache_key, video_info['channel'])
+        return cached
+
+    response = analyze_transcript_uncached(truncate_transcript(text_content), weapons)
+    # Only keep usable answers so errors and garbled output are retried next run
+    if parse_gemini_response(response) is not None:
+        save_cached_analysis(cache_key, response)
+        save_video_analysis(video_info['id'], cache_key, video_info['channel'])
+    return response
+
+
+def extract_weapon_rolls(weapon_info, transcript, unconstrained_rolls, transcript_cache=None):
+    """Pass 2 for one pass-1 weapon: return its rolls as a list.
+
+    unconstrained_rolls(weapon_name) supplies single-pass rolls for weapons
+    without a perk pool; transcript_cache is the video's cached pass-2 prefix.
+    """
+    weapon_name = weapon_info.get('weapon', '')
+    mode = weapon_info.get('mode', 'Both')
+
+    if not weapon_name:
+        return []
+
+    # Get valid perks for this weapon
+    valid_perks = get_valid_perks_for_weapon(weapon_name)
+
+    if not valid_perks:
+        print(f"      ⚠️  No perk pool for '{weapon_name}', using unconstrained extraction")
+        # Fall back to original prompt, filtered to just this weapon
+        return unconstrained_rolls(weapon_name)
+
+    print(f"      🎯 Pass 2: Extracting {weapon_name} ({mode}) with {len(valid_perks['trait1'])} trait1, {len(valid_perks['trait2'])} trait2 options...")
+
+    # Build the per-weapon tail that follows the transcript
+    pass2_tail = CONSTRAINED_ROLL_PROMPT.format(
+        weapon_name=weapon_name,
+        mode=mode,
+        barrels=', '.join(valid_perks['barrels'][:20]) if valid_perks['barrels'] else 'N/A',
+        magazines=', '.join(valid_perks['magazines'][:20]) if valid_perks['magazines'] else 'N/A',
+        trait1=', '.join(valid_perks['trait1'][:20]) if valid_perks['trait1'] else 'N/A',
+        trait2=', '.join(valid_perks['trait2'][:20]) if valid_perks['trait2'] else 'N/A'
+    )
+
+    pass2_response = None
+    if transcript_cache:
+        pass2_response = call_gemini(pass2_tail, cached_content=transcript_cache,
+                                     cached_prefix=CONSTRAINED_TRANSCRIPT_PREFIX + transcript)
+        if pass2_response.startswith("❌") or pass2_response.startswith("⚠️"):
+            pass2_response = None
+    if pass2_response is None:
+        pass2_response = call_gemini(CONSTRAINED_TRANSCRIPT_PREFIX + transcript + pass2_tail)
+    roll = parse_gemini_response(pass2_response)
+
+    # Handle both single roll (dict) and multiple rolls (list)
+    if isinstance(roll, dict):
+        return [roll]
+    if isinstance(roll, list):
+        return roll
+    return []
+
 
-    transcript = text_content[:30000]
+def analyze_transcript_uncached(transcript, weapons=None):
+    """Extract god rolls from a (truncated) transcript using two-pass validation.
 
+    weapons skips pass 1 when it was already done in a batched call.
+    """
     # Check if we have perk pool data for two-pass validation
     if not WEAPON_PERK_POOLS or not PERK_NAMES:
         print("      ℹ️  No perk pool data - using single-pass extraction")
-        prompt = GOD_ROLL_PROMPT + transcript
-        return call_gemini(prompt)
+        return call_cached_prompt(GOD_ROLL_PROMPT, transcript)
 
     # === PASS 1: Extract weapon names ===
-    print("      📋 Pass 1: Extracting weapons...")
-    pass1_prompt = WEAPON_EXTRACT_PROMPT + transcript
-    pass1_response = call_gemini(pass1_prompt)
-    weapons = parse_gemini_response(pass1_response)
+    if weapons is None:
+        print("      📋 Pass 1: Extracting weapons...")
+        pass1_response = call_cached_prompt(WEAPON_EXTRACT_PROMPT, transcript)
+        weapons = parse_gemini_response(pass1_response)
 
     if not weapons:
         print("      ⚠️  No weapons found in pass 1, falling back to single-pass")
-        prompt = GOD_ROLL_PROMPT + transcript
-        return call_gemini(prompt)
+        return call_cached_prompt(GOD_ROLL_PROMPT, transcript)
 
     print(f"      ✅ Found {len(weapons)} weapon(s): {', '.join(w.get('weapon', '?') for w in weapons)}")
 
     # === PASS 2: Extract constrained rolls for each weapon ===
-    all_rolls = []
-
-    for weapon_info in weapons:
-        weapon_name = weapon_info.get('weapon', '')
-        mode = weapon_info.get('mode', 'Both')
-
-        if not weapon_name:
-            continue
-
-        # Get valid perks for this weapon
-        valid_perks = get_valid_perks_for_weapon(weapon_name)
-
-        if not valid_perks:
-            print(f"      ⚠️  No perk pool for '{weapon_name}', using unconstrained extraction")
-            # Fall back to original prompt for this weapon
-            prompt = GOD_ROLL_PROMPT + transcript
-            response = call_gemini(prompt)
-            rolls = parse_gemini_response(response)
-            if rolls:
-                # Filter to just this weapon
-                for roll in rolls:
-                    if roll.get('weapon', '').lower() == weapon_name.lower():
-                        all_rolls.append(roll)
-            continue
-
-        print(f"      🎯 Pass 2: Extracting {weapon_name} ({mode}) with {len(valid_perks['trait1'])} trait1, {len(valid_perks['trait2'])} trait2 options...")
-
-        # Build constrained prompt
-        pass2_prompt = CONSTRAINED_ROLL_PROMPT.format(
-            weapon_name=weapon_name,
-            mode=mode,
-            barrels=', '.join(valid_perks['barrels'][:20]) if valid_perks['barrels'] else 'N/A',
-            magazines=', '.join(valid_perks['magazines'][:20]) if valid_perks['magazines'] else 'N/A',
-            trait1=', '.join(valid_perks['trait1'][:20]) if valid_perks['trait1'] else 'N/A',
-            trait2=', '.join(valid_perks['trait2'][:20]) if valid_perks['trait2'] else 'N/A'
-        ) + transcript
-
-        pass2_response = call_gemini(pass2_prompt)
-        roll = parse_gemini_response(pass2_response)
-
-        if roll:
-            # Handle both single roll (dict) and multiple rolls (list)
-            if isinstance(roll, dict):
-                all_rolls.append(roll)
-            elif isinstance(roll, list):
-                all_rolls.extend(roll)
+    # Unconstrained rolls indexed by lowercase weapon name; the single-pass
+    # call covers every weapon, so it is made at most once per video even when
+    # several weapons fall back at the same time
+    unconstrained = None
+    unconstrained_lock = threading.Lock()
+
+    def unconstrained_rolls(weapon_name):
+        nonlocal unconstrained
+        with unconstrained_lock:
+            if unconstrained is None:
+                unconstrained = {}
+                rolls = parse_gemini_response(call_cached_prompt(GOD_ROLL_PROMPT, transcript))
+                for roll in (rolls or ()):
+                    unconstrained.setdefault(roll.get('weapon', '').lower(), []).append(roll)
+        return unconstrained.get(weapon_name.lower(), [])
+
+    # With several weapons the transcript is cached once and each call only
+    # sends its perk lists; a single weapon isn't worth the cache round trip
+    transcript_cache = create_transcript_cache(transcript) if len(weapons) > 1 else None
+
+    # Each weapon's call is independent, so they run concurrently (the shared
+    # rate limiter still paces them); map keeps the rolls in pass-1 order
+    try:
+        with ThreadPoolExecutor(max_workers=PASS2_WORKERS) as executor:
+            all_rolls = [
+                roll
+                for rolls in executor.map(
+                    lambda weapon_info: extract_weapon_rolls(
+                        weapon_info, transcript, unconstrained_rolls, transcript_cache
+                    ),
+                    weapons,
+                )
+                for roll in rolls
+            ]
+    finally:
+        if transcript_cache:
+            release_transcript_cache(transcript_cache)
 
     if all_rolls:
-        return json.dumps(all_rolls)
+        return orjson.dumps(all_rolls).decode() if HAS_ORJSON else json.dumps(all_rolls)
     else:
         # Fall back to original single-pass if two-pass yielded nothing
         print("      ⚠️  Two-pass yielded no results, falling back to single-pass")
-        prompt = GOD_ROLL_PROMPT + transcript
-        return call_gemini(prompt)
+        return call_cached_prompt(GOD_ROLL_PROMPT, transcript)
+
+# A ```json ... ``` fenced block; group 1 is the body (closing fence optional)
+_FENCE_RE = re.compile(r'^```(?:json)?\s*(.*?)\s*(?:```)?\Z', re.DOTALL)
 
 def parse_gemini_response(response_text):
     """Parse JSON from Gemini response, handling markdown code blocks."""
     # Strip markdown code blocks if present
     text = response_text.strip()
     if text.startswith('```'):
-        # Remove ```json and ``` markers
-        text = re.sub(r'^```json?\s*', '', text)
-        text = re.sub(r'\s*```$', '', text)
+        text = _FENCE_RE.match(text).group(1)
 
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
+        return orjson.loads(text) if HAS_ORJSON else json.loads(text)
+    except ValueError:  # json.JSONDecodeError and orjson.JSONDecodeError both subclass it
         return None
 
-def lookup_hash(name, lookup_dict, threshold=75):
-    """Look up a hash by name, with optional fuzzy matching."""
+def lookup_hash(name, lookup_dict, keys, choices, threshold=75):
+    """Look up a hash by name, with optional fuzzy matching.
+
+    choices is keys after default_process, in the same order.
+    """
     if not name:
         return None, False
 
@@ -522,17 +1162,85 @@ def lookup_hash(name, lookup_dict, threshold=75):
         return lookup_dict[name_lower], True
 
     # Fuzzy match if available
-    if HAS_FUZZY and lookup_dict:
-        result = process.extractOne(name_lower, lookup_dict.keys(), scorer=fuzz.token_sort_ratio)
-        if result and result[1] >= threshold:
-            matched_name = result[0]
+    if HAS_FUZZY and keys:
+        # token_sort_ratio forgives misspellings and word order but not a
+        # name that is only a fragment of another ("clip" vs "heal clip"),
+        # so partial names stay misses instead of resolving to a wrong hash
+        result = process.extractOne(utils.default_process(name_lower), choices,
+                                    scorer=fuzz.token_sort_ratio, score_cutoff=threshold)
+        if result:
+            matched_name = keys[result[2]]
             return lookup_dict[matched_name], False  # False = fuzzy match
 
     return None, False
 
-def generate_readable_markdown(all_raw_rolls):
-    """Generate human-readable markdown from raw god roll data."""
-    lines = []
+def resolve_names_batch(names, lookup_dict, keys, choices, memo, threshold=75):
+    """Resolve many names at once, returning {name: (hash, exact)}.
+
+    Exact hits are plain dict lookups; the remaining names are fuzzy matched
+    together in a single rapidfuzz cdist pass instead of one extractOne scan
+    per name. Every result, including misses, is remembered in memo under both
+    the name as given and its normalized form, so names repeated across rolls
+    and output formats cost a single dict probe after the first time.
+    """
+    resolved = {}
+    misses = {}
+    for name in names:
+        if name in resolved:
+            continue
+        # Raw-name hit: no need to normalize again
+        match = memo.get(name)
+        if match is None:
+            name_lower = name.lower().strip() if name else ''
+            match = memo.get(name_lower)
+            if match is None:
+                if name_lower in lookup_dict:
+                    match = memo[name_lower] = (lookup_dict[name_lower], True)
+                else:
+                    match = (None, False)
+                    if name_lower and HAS_FUZZY and keys:
+                        misses.setdefault(name_lower, []).append(name)
+                        continue
+            memo[name] = match
+        resolved[name] = match
+
+    if not misses:
+        return resolved
+
+    if HAS_NUMPY:
+        queries = list(misses)
+        # Default float32 scores: rounding to integers would create ties that
+        # argmax breaks by key order, picking a different match than extractOne
+        scores = process.cdist(
+            [utils.default_process(q) for q in queries], choices,
+            scorer=fuzz.token_sort_ratio, score_cutoff=threshold, workers=-1,
+        )
+        best = scores.argmax(axis=1)
+        for name_lower, row, idx in zip(queries, scores, best):
+            memo[name_lower] = (lookup_dict[keys[idx]], False) if row[idx] >= threshold else (None, False)
+    else:
+        for name_lower in misses:
+            memo[name_lower] = lookup_hash(name_lower, lookup_dict, keys, choices, threshold)
+
+    for name_lower, originals in misses.items():
+        for name in originals:
+            resolved[name] = memo[name] = memo[name_lower]
+
+    return resolved
+
+# (table label, roll key) for the perk rows of the markdown table
+MARKDOWN_COLUMNS = (('Barrel', 'barrel'), ('Magazine', 'magazine'), ('Trait 1', 'trait1'), ('Trait 2', 'trait2'))
+
+def _norm_perks(value):
+    """Turn a roll column (list, single name or None) into a list of names."""
+    if not value:
+        return []
+    return [p for p in (value if isinstance(value, list) else [value]) if p]
+
+def generate_readable_markdown(all_raw_rolls, f):
+    """Write human-readable markdown for raw god roll data to an open file."""
+    def write(line):
+        f.write(line + "\n")
 
     # Group by weapon
     weapons = {}
@@ -549,54 +1257,35 @@ def generate_readable_markdown(all_raw_rolls):
 
     # Sort weapons alphabetically
     for weapon_name in sorted(weapons.keys()):
-        lines.append(f"## {weapon_name}\n")
+        write(f"## {weapon_name}\n")
 
         for entry in weapons[weapon_name]:
             roll = entry['roll']
             video = entry['video']
 
             mode = roll.get('mode', 'Unknown')
-            lines.append(f"### {mode} Roll\n")
+            write(f"### {mode} Roll\n")
 
             # Perks table
-            lines.append("| Column | Perks |")
-            lines.append("|--------|-------|")
-
-            if roll.get('barrel'):
-                perks = roll['barrel'] if isinstance(roll['barrel'], list) else [roll['barrel']]
-                perks = [p for p in perks if p]
-                if perks:
-                    lines.append(f"| Barrel | {', '.join(perks)} |")
-
-            if roll.get('magazine'):
-                perks = roll['magazine'] if isinstance(roll['magazine'], list) else [roll['magazine']]
-                perks = [p for p in perks if p]
-                if perks:
-                    lines.append(f"| Magazine | {', '.join(perks)} |")
+            write("| Column | Perks |")
+            write("|--------|-------|")
 
-            if roll.get('trait1'):
-                perks = roll['trait1'] if isinstance(roll['trait1'], list) else [roll['trait1']]
-                perks = [p for p in perks if p]
+            for label, column_key in MARKDOWN_COLUMNS:
+                perks = _norm_perks(roll.get(column_key))
                 if perks:
-                    lines.append(f"| Trait 1 | {', '.join(perks)} |")
-
-            if roll.get('trait2'):
-                perks = roll['trait2'] if isinstance(roll['trait2'], list) else [roll['trait2']]
-                perks = [p for p in perks if p]
-                if perks:
-                    lines.append(f"| Trait 2 | {', '.join(perks)} |")
+                    write(f"| {label} | {', '.join(perks)} |")
 
             if roll.get('originTrait'):
-                lines.append(f"| Origin | {roll['originTrait']} |")
+                write(f"| Origin | {roll['originTrait']} |")
 
             if roll.get('masterwork'):
-                lines.append(f"| Masterwork | {roll['masterwork']} |")
+                write(f"| Masterwork | {roll['masterwork']} |")
 
-            lines.append("")
+            write("")
 
             # Reasoning
             if roll.get('reasoning'):
-                lines.append(f"**Why:** {roll['reasoning']}\n")
+                write(f"**Why:** {roll['reasoning']}\n")
 
             # Source
             timestamp = roll.get('timestamp', '')
@@ -605,38 +1294,86 @@ def generate_readable_markdown(all_raw_rolls):
             channel = video.get('channel', '')
 
             if video_id and timestamp:
-                seconds = timestamp_to_seconds(timestamp)
-                url = f"https://www.youtube.com/watch?v={video_id}&t={seconds}s" if seconds else f"https://www.youtube.com/watch?v={video_id}"
-                lines.append(f"**Source:** [{video_title}]({url}) by {channel} @ {timestamp}\n")
+                url = build_timestamped_url(video_id, timestamp)
+                write(f"**Source:** [{video_title}]({url}) by {channel} @ {timestamp}\n")
             elif video_title:
-                lines.append(f"**Source:** {video_title} by {channel}\n")
+                write(f"**Source:** {video_title} by {channel}\n")
+
+            write("---\n")
+
 
-            lines.append("---\n")
+def _iter_roll_perks(roll):
+    """Yield (column_index, perk_name) for each real perk in a roll, in PERK_COLUMNS order.
 
-    return "\n".join(lines)
+    Columns may hold a list or a single name; empty and 'null' entries are dropped.
+    """
+    for index, column_key in enumerate(PERK_COLUMNS):
+        for perk in _norm_perks(roll.get(column_key)):
+            if perk != 'null':
+                yield index, perk
 
+def resolve_roll_names(all_raw_rolls):
+    """Batch-resolve every weapon and perk name in the rolls.
 
-def convert_to_dim_format(all_raw_rolls, wishlist_name, description):
+    Returns:
+        tuple: ({weapon_name: (hash, exact)}, {perk_name: (hash, exact)})
+    """
+    weapon_names = []
+    perk_names = []
+    for item in all_raw_rolls:
+        for roll in item['rolls']:
+            weapon_names.append(roll.get('weapon', ''))
+            perk_names.extend(perk for _, perk in _iter_roll_perks(roll))
+    return (resolve_names_batch(weapon_names, WEAPON_LOOKUP, WEAPON_KEYS, WEAPON_CHOICES, _weapon_matches),
+            resolve_names_batch(perk_names, PERK_LOOKUP, PERK_KEYS, PERK_CHOICES, _perk_matches))
+
+def resolve_perk_columns(roll, perk_matches, uncertain):
+    """Map a roll's perk names to one list of hashes per column in PERK_COLUMNS.
+
+    Fuzzy and unknown perks are noted in uncertain.
+    """
+    columns = [[] for _ in PERK_COLUMNS]
+    for index, perk in _iter_roll_perks(roll):
+        h, exact = perk_matches[perk]
+        if h:
+            columns[index].append(h)
+            if not exact:
+                uncertain.append(f"⚠️ Fuzzy perk match: '{perk}'")
+        else:
+            uncertain.append(f"❓ Unknown perk: '{perk}'")
+    return columns
+
+def convert_to_dim_format(all_raw_rolls, wishlist_name, description, f):
     """Convert raw god rolls to DIM wishlist format (.txt).
 
-    DIM format generates one line per perk combination. If a roll has multiple
-    perks in a column (OR logic), we generate separate dimwishlist lines for each.
+    Each roll becomes one dimwishlist line: perks within a column are OR'd
+    with | and columns AND'd with ,. A roll identical to one already written
+    (same weapon, perks and tags) is skipped.
+
+    Lines are written to the open file as they are generated rather than
+    collected and joined, so the whole wishlist is never held in memory twice.
 
     Args:
         all_raw_rolls: List of {'video_info': {...}, 'rolls': [...]} dicts
         wishlist_name: Name for the wishlist
         description: Description for the wishlist
+        f: Text file object to write the wishlist to
 
     Returns:
-        tuple: (dim_text_content, uncertain_items_list)
+        tuple: (dimwishlist_line_count, uncertain_items_list)
     """
-    lines = []
     uncertain = []
+    entry_count = 0
+    # (weapon hash, perks, tags) already written; the same roll recommended
+    # by several videos would otherwise repeat an identical wishlist entry
+    seen_entries = set()
 
     # Header
-    lines.append(f"title:{wishlist_name}")
-    lines.append(f"description:{description}")
-    lines.append("")
+    f.write(f"title:{wishlist_name}\n")
+    f.write(f"description:{description}\n")
+    f.write("\n")
+
+    weapon_matches, perk_matches = resolve_roll_names(all_raw_rolls)
 
     for item in all_raw_rolls:
         video_info = item.get('video_info', {})
@@ -644,7 +1381,7 @@ def convert_to_dim_format(all_raw_rolls, wishlist_name, description):
 
         for roll in item['rolls']:
             weapon_name = roll.get('weapon', '')
-            weapon_hash, exact_weapon = lookup_hash(weapon_name, WEAPON_LOOKUP)
+            weapon_hash, exact_weapon = weapon_matches[weapon_name]
 
             if not weapon_hash:
                 uncertain.append(f"❓ Unknown weapon: '{weapon_name}'")
@@ -653,29 +1390,30 @@ def convert_to_dim_format(all_raw_rolls, wishlist_name, description):
             if not exact_weapon:
                 uncertain.append(f"⚠️ Fuzzy weapon match: '{weapon_name}'")
 
-            # Collect perk hashes for each column
-            columns = []  # List of lists of (hash, name) tuples
-
-            for column_key in ['barrel', 'magazine', 'trait1', 'trait2']:
-                column_perks = []
-                for perk in (roll.get(column_key) or []):
-                    if perk and perk != 'null':
-                        h, exact = lookup_hash(perk, PERK_LOOKUP)
-                        if h:
-                            column_perks.append((h, perk))
-                            if not exact:
-                                uncertain.append(f"⚠️ Fuzzy perk match: '{perk}'")
-                        else:
-                            uncertain.append(f"❓ Unknown perk: '{perk}'")
-                columns.append(column_perks if column_perks else [(None, None)])
-
-            # Build tags from mode (lowercase for DIM)
+            # A roll with no perks in any column has no line to emit; skip the
+            # lookups and the orphaned notes comment entirely
+            if not any(roll.get(k) for k in PERK_COLUMNS):
+                continue
+
+            # Only columns with at least one resolved perk are kept, each
+            # joined with | (OR) up front
+            perk_columns = [
+                "|".join(map(str, column_hashes))
+                for column_hashes in resolve_perk_columns(roll, perk_matches, uncertain)
+                if column_hashes
+            ]
+
+            # Tags from mode (lowercase for DIM)
             mode = roll.get('mode', 'Both')
-            tags = []
-            if mode in ['PvE', 'Both']:
-                tags.append('pve')
-            if mode in ['PvP', 'Both']:
-                tags.append('pvp')
+            tags_str = DIM_MODE_TAGS.get(mode, 'pve')
+
+            # Join columns with , (AND)
+            perks_str = ",".join(perk_columns)
+            if perk_columns:
+                entry_key = (weapon_hash, perks_str, tags_str)
+                if entry_key in seen_entries:
+                    continue
+                seen_entries.add(entry_key)
 
             # Build reasoning/notes
             reasoning = roll.get('reasoning', '')
@@ -689,31 +1427,19 @@ def convert_to_dim_format(all_raw_rolls, wishlist_name, description):
             block_comment = f"//notes:{weapon_name} - {mode}"
             if timestamp:
                 block_comment += f" @ {timestamp}"
-            lines.append(block_comment)
-
-            # Build perks string with OR syntax (pipe-separated within column, comma between columns)
-            perk_columns = []
-            for col_perks in columns:
-                # Filter out None entries
-                valid_hashes = [str(h) for h, name in col_perks if h is not None]
-                if valid_hashes:
-                    # Join multiple perks in same column with | (OR)
-                    perk_columns.append("|".join(valid_hashes))
+            f.write(block_comment + "\n")
 
             if perk_columns:
-                # Join columns with , (AND)
-                perks_str = ",".join(perk_columns)
-                tags_str = ",".join(tags) if tags else "pve"
-
                 line = f"dimwishlist:item={weapon_hash}&perks={perks_str}#notes:{short_note}|tags:{tags_str}"
-                lines.append(line)
+                f.write(line + "\n")
+                entry_count += 1
 
-            lines.append("")  # Blank line between rolls
+            f.write("\n")  # Blank line between rolls
 
-    return "\n".join(lines), uncertain
+    return entry_count, uncertain
 
 
-def convert_to_littlelight_format(all_raw_rolls, wishlist_name, description):
+def convert_to_littlelight_format(all_raw_rolls, wishlist_name, description, f):
     """Convert raw god rolls to Little Light JSON format.
 
     Little Light format uses arrays of acceptable perks per column (OR logic),
@@ -723,13 +1449,16 @@ def convert_to_littlelight_format(all_raw_rolls, wishlist_name, description):
         all_raw_rolls: List of {'video_info': {...}, 'rolls': [...]} dicts
         wishlist_name: Name for the wishlist
         description: Description for the wishlist
+        f: Text file object to write the JSON to
 
     Returns:
-        tuple: (json_string, uncertain_items_list)
+        tuple: (roll_entry_count, uncertain_items_list)
     """
     data = []
     uncertain = []
 
+    weapon_matches, perk_matches = resolve_roll_names(all_raw_rolls)
+
     for item in all_raw_rolls:
         video_info = item.get('video_info', {})
         video_title = video_info.get('title', '')
@@ -738,7 +1467,7 @@ def convert_to_littlelight_format(all_raw_rolls, wishlist_name, description):
 
         for roll in item['rolls']:
             weapon_name = roll.get('weapon', '')
-            weapon_hash, exact_weapon = lookup_hash(weapon_name, WEAPON_LOOKUP)
+            weapon_hash, exact_weapon = weapon_matches[weapon_name]
 
             if not weapon_hash:
                 uncertain.append(f"❓ Unknown weapon: '{weapon_name}'")
@@ -748,30 +1477,14 @@ def convert_to_littlelight_format(all_raw_rolls, wishlist_name, description):
                 uncertain.append(f"⚠️ Fuzzy weapon match: '{weapon_name}'")
 
             # Build plugs array (4 columns: barrel, magazine, trait1, trait2)
-            plugs = []
-
-            for column_key in ['barrel', 'magazine', 'trait1', 'trait2']:
-                column_hashes = []
-                for perk in (roll.get(column_key) or []):
-                    if perk and perk != 'null':
-                        h, exact = lookup_hash(perk, PERK_LOOKUP)
-                        if h:
-                            column_hashes.append(int(h))
-                            if not exact:
-                                uncertain.append(f"⚠️ Fuzzy perk match: '{perk}'")
-                        else:
-                            uncertain.append(f"❓ Unknown perk: '{perk}'")
-                plugs.append(column_hashes)
-
-            # Build tags from mode (Little Light uses GodPVE, GodPVP, PVE, PVP)
+            plugs = [
+                [int(h) for h in column_hashes]
+                for column_hashes in resolve_perk_columns(roll, perk_matches, uncertain)
+            ]
+
+            # Tags from mode (Little Light uses GodPVE, GodPVP, PVE, PVP)
             mode = roll.get('mode', 'Both')
-            tags = []
-            if mode == 'PvE':
-                tags.append('GodPVE')
-            elif mode == 'PvP':
-                tags.append('GodPVP')
-            elif mode == 'Both':
-                tags.extend(['GodPVE', 'GodPVP'])
+            tags = list(LITTLELIGHT_MODE_TAGS.get(mode, ()))
 
             # Build roll name from weapon and mode
             roll_name = f"{weapon_name} - {mode}"
@@ -800,7 +1513,96 @@ def convert_to_littlelight_format(all_raw_rolls, wishlist_name, description):
         'data': data
     }
 
-    return json.dumps(result, indent=2), uncertain
+    if HAS_ORJSON:
+        f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+    else:
+        json.dump(result, f, indent=2)
+    return len(data), uncertain
+
+
+def fetch_video(index, total, video):
+    """Download subtitles for one video (pipeline stage 1).
+
+    Returns (video_info, transcript, saved_analysis, uncertain_note). A video
+    analyzed on an earlier run comes back with its saved_analysis and no
+    download; otherwise transcript is None when the video has no subtitles,
+    with uncertain_note explaining why.
+    """
+    title = video['title']
+    url = video['url']
+    video_id = video.get('id', '')
+    channel = video.get('channel', '')
+    tag = f"[{index + 1}/{total}]"
+
+    print(f"\n{tag} {title}")
+
+    saved = load_video_analysis(video_id)
+    if saved:
+        saved_analysis, saved_channel = saved
+        if not channel or channel == 'Unknown':
+            channel = saved_channel or 'Unknown'
+        print(f"   {tag} ♻️  Using saved analysis, skipping subtitle download")
+        video_info = {'title': title, 'id': video_id, 'channel': channel, 'url': url}
+        return video_info, None, saved_analysis, None
+
+    transcript, metadata = get_transcript_with_ytdlp(url)
+
+    # Flat playlist entries often lack the channel; the subtitle fetch
+    # already extracted the full metadata, so fill it in from there
+    if metadata:
+        if not channel or channel == 'Unknown':
+            channel = metadata.get('channel', 'Unknown')
+        if not video_id:
+            video_id = metadata.get('id', '')
+
+    if channel and channel != 'Unknown':
+        print(f"   {tag} 👤 Channel: {channel}")
+
+    video_info = {
+        'title': title,
+        'id': video_id,
+        'channel': channel,
+        'url': url,
+    }
+
+    if not transcript:
+        print(f"   {tag} ❌ No subtitles found")
+        return video_info, None, None, f"\n## {title}\n❌ No subtitles available"
+
+    return video_info, transcript, None, None
+
+
+def analyze_video(index, total, video_info, transcript, raw_response=None, weapons=None):
+    """Extract god rolls from a downloaded transcript (pipeline stage 2).
+
+    raw_response, when given, is a saved analysis to use instead of calling
+    Gemini; weapons is a batched pass-1 result. Runs on a worker thread, so
+    it reports back instead of touching shared state. Returns (video_info,
+    god_rolls, uncertain_note): god_rolls is None when the video produced no
+    rolls, and uncertain_note (or None) is the entry for the review section.
+    """
+    title = video_info['title']
+    tag = f"[{index + 1}/{total}]"
+
+    if raw_response is None:
+        raw_response = analyze_transcript(transcript, video_info, weapons)
+
+    if raw_response.startswith("❌") or raw_response.startswith("⚠️"):
+        print(f"   {tag} {raw_response}")
+        return None, None, f"\n## {title}\n{raw_response}"
+
+    god_rolls = parse_gemini_response(raw_response)
+
+    if god_rolls is None:
+        print(f"   {tag} ⚠️ Failed to parse JSON response")
+        return None, None, f"\n## {title}\n⚠️ Failed to parse: {raw_response[:200]}..."
+
+    if not god_rolls:
+        print(f"   {tag} 📭 No god rolls found in video")
+        return None, None, None
+
+    print(f"   {tag} ✅ Found {len(god_rolls)} god roll(s)")
+    return video_info, god_rolls, None
 
 
 # --- MAIN EXECUTION ---
@@ -853,72 +1655,74 @@ if __name__ == "__main__":
     all_uncertain = []
     all_raw_rolls = []  # For markdown and LittleLight export
 
-    for i, video in enumerate(videos):
-        if i < start_index:
-            continue
-
-        title = video['title']
-        url = video['url']
-        video_id = video.get('id', '')
-        channel = video.get('channel', '')
-
-        print(f"\n[{i+1}/{len(videos)}] {title}")
-
-        # If channel is missing from playlist data, fetch full metadata
-        if not channel or channel == 'Unknown':
-            print(f"   📡 Fetching video metadata...")
-            metadata = get_video_metadata(url)
-            if metadata:
-                channel = metadata.get('channel', 'Unknown')
-                if not video_id:
-                    video_id = metadata.get('id', '')
-
-        if channel and channel != 'Unknown':
-            print(f"   👤 Channel: {channel}")
-
-        transcript = get_transcript_with_ytdlp(url)
-
-        if not transcript:
-            print(f"   ❌ No subtitles found")
-            all_uncertain.append(f"\n## {title}\n❌ No subtitles available")
-            continue
-
-        raw_response = analyze_transcript(transcript, title)
-
-        if raw_response.startswith("❌") or raw_response.startswith("⚠️"):
-            print(f"   {raw_response}")
-            all_uncertain.append(f"\n## {title}\n{raw_response}")
-            continue
-
-        god_rolls = parse_gemini_response(raw_response)
-
-        if god_rolls is None:
-            print(f"   ⚠️ Failed to parse JSON response")
-            all_uncertain.append(f"\n## {title}\n⚠️ Failed to parse: {raw_response[:200]}...")
-            continue
-
-        if not god_rolls:
-            print(f"   📭 No god rolls found in video")
-            continue
-
-        print(f"   ✅ Found {len(god_rolls)} god roll(s)")
-
-        # Build video info
-        video_info = {
-            'title': title,
-            'id': video_id,
-            'channel': channel,
-            'url': url,
+    # Two-stage pipeline: subtitle downloads run ahead in their own pool and
+    # finished transcripts are handed to the analysis pool, so downloads never
+    # wait behind Gemini; call_gemini's shared rate limiter keeps the analysis
+    # side under quota. Transcripts that need a fresh two-pass analysis are
+    # grouped PASS1_BATCH_SIZE at a time so their pass 1 shares one call.
+    queued = list(enumerate(videos))[start_index:]
+    results = [None] * len(queued)
+    batch_pass1 = bool(WEAPON_PERK_POOLS and PERK_NAMES) and PASS1_BATCH_SIZE > 1
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as downloads, \
+            ThreadPoolExecutor(max_workers=ANALYZE_WORKERS) as analyses:
+        fetching = {
+            downloads.submit(fetch_video, i, len(videos), video): (slot, i)
+            for slot, (i, video) in enumerate(queued)
         }
-
-        # Store raw rolls for markdown and LittleLight export
-        all_raw_rolls.append({
-            'video_info': video_info,
-            'rolls': god_rolls
-        })
-
-        # Rate limit protection
-        time.sleep(10)
+        batching = {}  # batched pass-1 future -> [(slot, i, video_info, transcript)]
+        pass1_queue = []
+        analyzing = {}
+
+        def submit_analysis(slot, i, video_info, transcript, saved_analysis=None, weapons=None):
+            analyzing[analyses.submit(
+                analyze_video, i, len(videos), video_info, transcript, saved_analysis, weapons
+            )] = slot
+
+        while fetching or batching:
+            done, _ = wait(list(fetching) + list(batching), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in batching:
+                    weapons_by_slot = future.result()
+                    for slot, i, video_info, transcript in batching.pop(future):
+                        submit_analysis(slot, i, video_info, transcript, weapons=weapons_by_slot.get(str(slot)))
+                    continue
+
+                slot, i = fetching.pop(future)
+                video_info, transcript, saved_analysis, uncertain_note = future.result()
+                if transcript is None and saved_analysis is None:
+                    results[slot] = (None, None, uncertain_note)
+                elif saved_analysis is not None or not batch_pass1 or has_saved_analysis(transcript):
+                    submit_analysis(slot, i, video_info, transcript, saved_analysis)
+                else:
+                    pass1_queue.append((slot, i, video_info, transcript))
+
+            # Flush full batches, or whatever is left once downloads are done
+            batches, pass1_queue = take_pass1_batches(pass1_queue, not fetching)
+            for jobs in batches:
+                if len(jobs) == 1:
+                    submit_analysis(*jobs[0])
+                else:
+                    batching[analyses.submit(
+                        batch_extract_weapons, {str(slot): transcript for slot, _, _, transcript in jobs}
+                    )] = jobs
+
+        for future in as_completed(analyzing):
+            results[analyzing[future]] = future.result()
+
+    close_thread_ydls()
+    release_prompt_caches()
+
+    # Collect in playlist order so output doesn't depend on completion order
+    for video_info, god_rolls, uncertain_note in results:
+        if uncertain_note:
+            all_uncertain.append(uncertain_note)
+        if god_rolls:
+            # Store raw rolls for markdown and LittleLight export
+            all_raw_rolls.append({
+                'video_info': video_info,
+                'rolls': god_rolls
+            })
 
     # --- FINAL SUMMARY ---
 
@@ -947,58 +1751,47 @@ if __name__ == "__main__":
         wishlist_desc = f"Extracted from: {video_link}"
 
     # Generate output filenames with weapon name
-    dim_filename = os.path.join(OUTPUT_DIR, f"God_Rolls_{timestamp}_{safe_weapon_name}.txt")
-    littlelight_filename = os.path.join(OUTPUT_DIR, f"God_Rolls_{timestamp}_{safe_weapon_name}.json")
-    markdown_filename = os.path.join(OUTPUT_DIR, f"God_Rolls_{timestamp}_{safe_weapon_name}.md")
-
-    # Generate DIM wishlist format
-    dim_content, dim_uncertain = convert_to_dim_format(
-        all_raw_rolls,
-        wishlist_name=wishlist_title,
-        description=wishlist_desc
-    )
-    all_uncertain.extend(dim_uncertain)
+    output_base = Path(OUTPUT_DIR) / f"God_Rolls_{timestamp}_{safe_weapon_name}"
+    dim_filename = output_base.with_suffix('.txt')
+    littlelight_filename = output_base.with_suffix('.json')
+    markdown_filename = output_base.with_suffix('.md')
 
+    # Generate DIM wishlist format (streamed straight to disk)
     with open(dim_filename, 'w', encoding='utf-8') as f:
-        f.write(dim_content)
+        dim_line_count, dim_uncertain = convert_to_dim_format(
+            all_raw_rolls,
+            wishlist_name=wishlist_title,
+            description=wishlist_desc,
+            f=f
+        )
+    all_uncertain.extend(dim_uncertain)
 
-    # Count dimwishlist lines
-    dim_line_count = sum(1 for line in dim_content.split('\n') if line.startswith('dimwishlist:'))
-    print(f"\n✅ DIM: Saved {dim_line_count} wishlist entries to {os.path.basename(dim_filename)}")
+    print(f"\n✅ DIM: Saved {dim_line_count} wishlist entries to {dim_filename.name}")
 
     # Generate Little Light JSON format
-    littlelight_content, ll_uncertain = convert_to_littlelight_format(
-        all_raw_rolls,
-        wishlist_name=wishlist_title,
-        description=wishlist_desc
-    )
-    # Don't duplicate uncertain items (already captured in DIM conversion)
-
     with open(littlelight_filename, 'w', encoding='utf-8') as f:
-        f.write(littlelight_content)
+        ll_entry_count, ll_uncertain = convert_to_littlelight_format(
+            all_raw_rolls,
+            wishlist_name=wishlist_title,
+            description=wishlist_desc,
+            f=f
+        )
+    # Don't duplicate uncertain items (already captured in DIM conversion)
 
-    # Count entries in Little Light format
-    ll_data = json.loads(littlelight_content)
-    ll_entry_count = len(ll_data.get('data', []))
-    print(f"✅ Little Light: Saved {ll_entry_count} roll entries to {os.path.basename(littlelight_filename)}")
+    print(f"✅ Little Light: Saved {ll_entry_count} roll entries to {littlelight_filename.name}")
 
-    # Human-readable markdown (with review section at bottom)
+    # Human-readable markdown (with review section at bottom), streamed to the file
     with open(markdown_filename, 'w', encoding='utf-8') as f:
-        f.write(f"# God Roll Recommendations\n\n")
-        f.write(f"Generated: {timestamp}\n")
-        f.write(f"Source: {video_link}\n\n")
-        f.write(generate_readable_markdown(all_raw_rolls))
-
-        # Add review/warnings section at bottom
-        f.write("\n---\n\n")
+        f.write(f"# God Roll Recommendations\n\nGenerated: {timestamp}\nSource: {video_link}\n\n")
+        generate_readable_markdown(all_raw_rolls, f)
+        f.write("---\n\n")
         if all_uncertain:
             f.write("## ⚠️ Items Needing Review\n\n")
-            f.write("\n".join(all_uncertain))
-            f.write("\n")
+            f.writelines(f"{note}\n" for note in all_uncertain)
         else:
             f.write("## ✅ All items matched successfully!\n")
 
-    print(f"📖 Markdown: {os.path.basename(markdown_filename)}")
+    print(f"📖 Markdown: {markdown_filename.name}")
     print(f"\n🎉 Done!")
     print(f"   → Import .txt into DIM or D3 app")
     print(f"   → Import .json into Little Light app")